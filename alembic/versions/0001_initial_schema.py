@@ -0,0 +1,92 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+Databases created earlier by Base.metadata.create_all() already have these
+tables: run `alembic stamp 0001` on them instead of upgrading through this revision.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "users",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("role", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index("ix_users_user_id", "users", ["user_id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "clients",
+        sa.Column("client_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("phone", sa.String(), nullable=True),
+        sa.Column("total_spent", sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint("client_id"),
+    )
+    op.create_index("ix_clients_client_id", "clients", ["client_id"])
+
+    op.create_table(
+        "products",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("stock", sa.Integer(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint("product_id"),
+    )
+    op.create_index("ix_products_product_id", "products", ["product_id"])
+    op.create_index("ix_products_name", "products", ["name"], unique=True)
+
+    op.create_table(
+        "bills",
+        sa.Column("bill_id", sa.Integer(), nullable=False),
+        sa.Column("client_id", sa.Integer(), nullable=False),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("total_amount", sa.Float(), nullable=False),
+        sa.Column("discount", sa.Float(), nullable=False),
+        sa.Column("final_amount", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["client_id"], ["clients.client_id"]),
+        sa.PrimaryKeyConstraint("bill_id"),
+    )
+    op.create_index("ix_bills_bill_id", "bills", ["bill_id"])
+
+    op.create_table(
+        "bill_items",
+        sa.Column("bill_item_id", sa.Integer(), nullable=False),
+        sa.Column("bill_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("subtotal", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["bill_id"], ["bills.bill_id"]),
+        sa.ForeignKeyConstraint(["product_id"], ["products.product_id"]),
+        sa.PrimaryKeyConstraint("bill_item_id"),
+    )
+    op.create_index("ix_bill_items_bill_item_id", "bill_items", ["bill_item_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("bill_items")
+    op.drop_table("bills")
+    op.drop_table("products")
+    op.drop_table("clients")
+    op.drop_table("users")
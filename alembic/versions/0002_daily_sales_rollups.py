@@ -0,0 +1,48 @@
+"""daily sales rollups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00
+
+After upgrading, fill the rollups from existing bills with `python rollups.py rebuild`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "daily_sales",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("bill_count", sa.Integer(), nullable=False),
+        sa.Column("gross", sa.Float(), nullable=False),
+        sa.Column("discount", sa.Float(), nullable=False),
+        sa.Column("net", sa.Float(), nullable=False),
+        sa.Column("items_sold", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("day"),
+    )
+    op.create_table(
+        "product_daily_sales",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.product_id"]),
+        sa.PrimaryKeyConstraint("day", "product_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("product_daily_sales")
+    op.drop_table("daily_sales")
@@ -0,0 +1,42 @@
+"""performance indexes for hot queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00
+
+On Postgres the indexes are built CONCURRENTLY so the upgrade does not block
+checkout writes. `python check_query_plans.py` verifies the hot queries use them.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_bills_date_bill_id", "bills", ["date", "bill_id"]),
+    ("ix_bills_client_id_date", "bills", ["client_id", "date"]),
+    ("ix_bill_items_bill_id_product_id", "bill_items", ["bill_id", "product_id"]),
+    ("ix_bill_items_product_id", "bill_items", ["product_id"]),
+    ("ix_clients_name", "clients", ["name"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,36 @@
+"""copy the bill date onto bill_items
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:30:00
+
+bill_items.bill_date mirrors bills.date. It is the partition key that lets
+bill_items be range-partitioned together with bills (`partitions.py convert`).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("bill_items", sa.Column("bill_date", sa.DateTime(), nullable=True))
+    op.execute(
+        "UPDATE bill_items SET bill_date = (SELECT bills.date FROM bills WHERE bills.bill_id = bill_items.bill_id)"
+    )
+    with op.batch_alter_table("bill_items") as batch:
+        batch.alter_column("bill_date", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("bill_items") as batch:
+        batch.drop_column("bill_date")
@@ -0,0 +1,28 @@
+"""partition bills and bill_items by month (moved out of the migration chain)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:40:00
+
+Intentionally a no-op. Converting bills/bill_items to monthly partitions rewrites
+both tables, so it is not part of the upgrade path: run `python partitions.py
+convert --confirm` (and `revert --confirm` to undo it) at any revision instead.
+The revision id is kept so databases already stamped at 0005 or later stay on
+the chain.
+"""
+from typing import Sequence, Union
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
@@ -0,0 +1,49 @@
+"""client search indexes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 10:00:00
+
+Postgres only: backs /clients/search with
+- a btree prefix index on lower(name) (text_pattern_ops, so LIKE 'abc%' can use it),
+- a btree prefix index on the phone number reduced to its digits,
+- a pg_trgm GIN index on lower(name) for fuzzy (similarity) matches.
+The expressions must stay identical to the ones in routes/clients.py.
+Other databases fall back to unindexed prefix matching.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_clients_name_lower_prefix", "USING btree (lower(name) text_pattern_ops)"),
+    ("ix_clients_phone_digits_prefix", "USING btree (regexp_replace(phone, '\\D', '', 'g') text_pattern_ops)"),
+    ("ix_clients_name_lower_trgm", "USING gin (lower(name) gin_trgm_ops)"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON clients {definition}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
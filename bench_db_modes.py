@@ -0,0 +1,51 @@
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://127.0.0.1:8000"
+
+# -----------------------------
+# Sync vs async DB mode throughput
+# Start the server once per mode and run this script against each:
+#   uvicorn main:app                                    (sync)
+#   DB_ASYNC_ROUTERS=bills,clients uvicorn main:app      (async)
+# Leave DATABASE_REPLICA_URL unset so both runs hit the same database.
+# Only endpoints without an in-process cache are measured: /products/list (catalog
+# snapshot) and /bills/{id} (bill cache) would mostly time cache hits, not the DB.
+# Usage: python bench_db_modes.py [concurrency] [seconds]
+# -----------------------------
+USERNAME = "admin"
+PASSWORD = "Admin@12345"
+ENDPOINTS = ["/bills/list?limit=50", "/clients/list", "/clients/search?q=c", "/clients/1/history?limit=50"]
+
+concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+duration = float(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+resp = requests.post(f"{BASE_URL}/auth/login", json={"username": USERNAME, "password": PASSWORD})
+resp.raise_for_status()
+headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def worker(path: str, deadline: float, counts: dict, lock: threading.Lock):
+    session = requests.Session()
+    ok = errors = 0
+    while time.perf_counter() < deadline:
+        r = session.get(f"{BASE_URL}{path}", headers=headers)
+        if r.status_code == 200:
+            ok += 1
+        else:
+            errors += 1
+    with lock:
+        counts["ok"] += ok
+        counts["errors"] += errors
+
+for path in ENDPOINTS:
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker, path, deadline, counts, lock)
+    print(f"{path:<24} c={concurrency:<4} {counts['ok'] / duration:8.1f} req/s  errors={counts['errors']}")
@@ -0,0 +1,62 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://127.0.0.1:8000"
+
+# -----------------------------
+# Login storm vs. listing latency
+# Measures /products/list latency on its own, then again while LOGIN_THREADS
+# clients hammer /auth/login. With bcrypt on the dedicated hash pool the two
+# numbers should stay close; before, listing queued behind bcrypt calls.
+# -----------------------------
+USERNAME = "admin"
+PASSWORD = "Admin@12345"
+LOGIN_THREADS = 32
+LIST_REQUESTS = 200
+
+def login(session: requests.Session) -> requests.Response:
+    return session.post(f"{BASE_URL}/auth/login", json={"username": USERNAME, "password": PASSWORD})
+
+def measure_listing(headers: dict) -> list:
+    session = requests.Session()
+    timings = []
+    for _ in range(LIST_REQUESTS):
+        t0 = time.perf_counter()
+        session.get(f"{BASE_URL}/products/list", headers=headers).raise_for_status()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+def report(label: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} p50={statistics.median(timings):7.1f}ms  p95={p95:7.1f}ms  max={timings[-1]:7.1f}ms")
+
+resp = login(requests.Session())
+resp.raise_for_status()
+headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+report("listing (idle)", measure_listing(headers))
+
+stop = threading.Event()
+logins = []
+
+def storm():
+    session = requests.Session()
+    while not stop.is_set():
+        login(session)
+        logins.append(1)
+
+with ThreadPoolExecutor(max_workers=LOGIN_THREADS) as pool:
+    for _ in range(LOGIN_THREADS):
+        pool.submit(storm)
+    time.sleep(1)   # let the storm saturate the hash pool first
+    timings = measure_listing(headers)
+    stop.set()
+
+report("listing (login storm)", timings)
+print(f"logins served during storm: {len(logins)}")
+print("hash pool:", requests.get(f"{BASE_URL}/auth/hash_stats", headers=headers).json())
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, Iterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from models import Bill, BillItem, Client, Product
+
+# -----------------------------
+# Shared read path for bill detail and invoice rendering
+# Bills never change after creation, so a loaded bill can be served from memory
+# and identified by a strong ETag derived from its content.
+# -----------------------------
+bill_cache = TTLCache(
+    maxsize=int(os.getenv("BILL_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("BILL_CACHE_TTL_SECONDS", "86400")),
+)
+
+def _bill_rows(db: Session, *item_conditions):
+    return db.query(
+        Bill.bill_id, Bill.client_id, Bill.date, Bill.total_amount, Bill.discount, Bill.final_amount,
+        Client.name, Client.phone,
+        BillItem.product_id, Product.name, BillItem.quantity, BillItem.price, BillItem.subtotal,
+    ).outerjoin(Client, Client.client_id == Bill.client_id)\
+     .outerjoin(BillItem, and_(BillItem.bill_id == Bill.bill_id, *item_conditions))\
+     .outerjoin(Product, Product.product_id == BillItem.product_id)
+
+def _bill_from_rows(rows) -> dict:
+    first = rows[0]
+    return {
+        "bill_id": first[0],
+        "client_id": first[1],
+        "client_name": first[6] or "",
+        "client_phone": first[7] or "",
+        "date": first[2].isoformat(),
+        "total_amount": first[3],
+        "discount": first[4],
+        "final_amount": first[5],
+        "items": [
+            {"product_id": r[8], "name": r[9], "quantity": r[10], "price": r[11], "subtotal": r[12]}
+            for r in rows if r[8] is not None
+        ],
+    }
+
+def load_bill(db: Session, bill_id: int) -> dict:
+    """Bill, client and items (with product names), from the cache or one joined query."""
+    cached = bill_cache.get(bill_id)
+    return cached if cached is not None else fetch_bill(db, bill_id)
+
+def fetch_bill(db: Session, bill_id: int) -> dict:
+    """load_bill without the cache lookup, for callers that already missed; caches the result."""
+    rows = _bill_rows(db).filter(Bill.bill_id == bill_id).order_by(BillItem.bill_item_id.asc()).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Bill not found")
+
+    bill = _bill_from_rows(rows)
+    digest = hashlib.sha256(json.dumps(bill, sort_keys=True).encode()).hexdigest()[:20]
+    bill["etag"] = f"{bill_id}-{digest}"
+    bill_cache.set(bill_id, bill)
+    return bill
+
+def load_bills(db: Session, bill_ids) -> Dict[int, dict]:
+    """Several bills by id in one joined query, uncached (no etag)."""
+    rows = _bill_rows(db).filter(Bill.bill_id.in_(list(bill_ids)))\
+        .order_by(Bill.bill_id.asc(), BillItem.bill_item_id.asc())\
+        .all()
+    return {bill_id: _bill_from_rows(list(group)) for bill_id, group in groupby(rows, key=lambda r: r[0])}
+
+def iter_bills(db: Session, start_dt: datetime, end_dt: datetime, batch_size: int = 1000) -> Iterator[dict]:
+    """Every bill dated within [start_dt, end_dt), oldest first, from one streamed joined query.
+
+    Bypasses the cache: bulk readers would only evict the bills cashiers are reprinting.
+    """
+    # The bill_date bounds on the join let Postgres prune bill_items partitions
+    rows = _bill_rows(db, BillItem.bill_date >= start_dt, BillItem.bill_date < end_dt)\
+        .filter(Bill.date >= start_dt, Bill.date < end_dt)\
+        .order_by(Bill.date.asc(), Bill.bill_id.asc(), BillItem.bill_item_id.asc())\
+        .yield_per(batch_size)
+    for _, group in groupby(rows, key=lambda r: r[0]):
+        yield _bill_from_rows(list(group))
+
+def etag_header(bill: dict, variant: str) -> str:
+    # Strong validators are per representation, so JSON and HTML get distinct tags
+    return f'"{bill["etag"]}-{variant}"'
+
+def is_not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
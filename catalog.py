@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Product
+
+# -----------------------------
+# In-process snapshot of the active product catalog
+# Product writes bump the catalog version, sales bump the stock version; the
+# snapshot is rebuilt lazily on the next read that needs it. Price/activity
+# checks only care about the catalog version, so checkouts don't force reloads.
+# The TTL bounds staleness when another worker process made the change.
+# -----------------------------
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "30"))
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    stock_version: int
+    loaded_at: float
+    products: Dict[int, Tuple[str, float]]   # active product_id -> (name, price)
+    body: bytes                              # pre-serialized /products/list response
+    etag: str
+
+_version = 0
+_stock_version = 0
+_snapshot: Optional[CatalogSnapshot] = None
+_lock = threading.Lock()
+
+def bump_version():
+    global _version
+    with _lock:
+        _version += 1
+
+def bump_stock_version():
+    global _stock_version
+    with _lock:
+        _stock_version += 1
+
+def current(with_stock: bool = True) -> Optional[CatalogSnapshot]:
+    snap = _snapshot
+    if snap is None or snap.version != _version or time.monotonic() - snap.loaded_at > CATALOG_TTL_SECONDS:
+        return None
+    if with_stock and snap.stock_version != _stock_version:
+        return None
+    return snap
+
+def load(db: Session, with_stock: bool = True) -> CatalogSnapshot:
+    global _snapshot
+    snap = current(with_stock)
+    if snap is not None:
+        return snap
+    # Read the versions before querying: a write that lands mid-load leaves this snapshot already stale
+    version, stock_version = _version, _stock_version
+    rows = db.query(Product.product_id, Product.name, Product.price, Product.stock)\
+        .filter(Product.is_active == True)\
+        .order_by(Product.name.asc())\
+        .all()
+    body = json.dumps([{"product_id": pid, "name": name, "price": price, "stock": stock} for pid, name, price, stock in rows]).encode()
+    snap = CatalogSnapshot(
+        version=version,
+        stock_version=stock_version,
+        loaded_at=time.monotonic(),
+        products={pid: (name, price) for pid, name, price, _ in rows},
+        body=body,
+        etag='"catalog-%s"' % hashlib.sha256(body).hexdigest()[:20],
+    )
+    with _lock:
+        if _snapshot is None or (version, stock_version) >= (_snapshot.version, _snapshot.stock_version):
+            _snapshot = snap
+    return snap
+
+def _item_error(products: Dict[int, Tuple[str, float]], items) -> Optional[Tuple[int, str]]:
+    for item in items:
+        entry = products.get(item.product_id)
+        if entry is None:
+            return 404, f"Product ID {item.product_id} not found"
+        name, price = entry
+        if abs(item.price - price) > 1e-9:
+            return 409, f"Price for {name} has changed, please refresh"
+    return None
+
+def check_items(db: Session, items) -> Optional[Tuple[int, str]]:
+    # (status_code, detail) for the first line whose product is unknown/inactive or priced differently.
+    # A mismatch is confirmed with one query for just the bill's products; the snapshot is only
+    # invalidated when those rows show it is stale, never because a client sent a wrong price
+    snap = load(db, with_stock=False)
+    error = _item_error(snap.products, items)
+    if error is None:
+        return None
+    ids = {item.product_id for item in items}
+    rows = db.query(Product.product_id, Product.name, Product.price)\
+        .filter(Product.product_id.in_(list(ids)), Product.is_active == True)\
+        .all()
+    fresh = {pid: (name, price) for pid, name, price in rows}
+    if any(snap.products.get(pid) != fresh.get(pid) for pid in ids):
+        bump_version()
+    return _item_error(fresh, items)
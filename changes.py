@@ -0,0 +1,128 @@
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from bill_cache import load_bills
+from models import ChangeLog, ChangeSequence, Client, Product
+
+# -----------------------------
+# Change feed
+# Writers call record_changes() inside their own transaction, as the last statement
+# before commit and after flushing their own row changes (sessions don't autoflush):
+# the counter row must be locked after the entity rows, as /bills/create does, or two
+# writers can deadlock (check_change_feed_order.py). Sequence numbers come from one counter row that stays locked until
+# that commit, so they become visible in commit order: a reader that has seen seq N
+# can never later find a newly committed change below N.
+# -----------------------------
+SEQUENCE_NAME = "changes"
+
+Change = Tuple[str, int, str]   # (entity, entity_id, op)
+
+def _dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Change sequence upsert not supported on {dialect}")
+    return insert
+
+def record_changes(db: Session, changes: Iterable[Change]):
+    changes = list(dict.fromkeys(changes))
+    if not changes:
+        return
+    insert = _dialect_insert(db)
+    stmt = insert(ChangeSequence).values(name=SEQUENCE_NAME, value=len(changes))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"value": ChangeSequence.value + stmt.excluded.value},
+    ).returning(ChangeSequence.value)
+    last = db.execute(stmt).scalar_one()
+    now = datetime.utcnow()
+    db.execute(ChangeLog.__table__.insert(), [
+        {"seq": last - len(changes) + i + 1, "entity": entity, "entity_id": entity_id, "op": op, "changed_at": now}
+        for i, (entity, entity_id, op) in enumerate(changes)
+    ])
+
+# -----------------------------
+# Reading
+# -----------------------------
+def _products(db: Session, ids) -> Dict[int, dict]:
+    rows = db.query(Product.product_id, Product.name, Product.price, Product.stock, Product.is_active)\
+        .filter(Product.product_id.in_(ids))
+    return {r.product_id: {"product_id": r.product_id, "name": r.name, "price": r.price, "stock": r.stock, "is_active": r.is_active} for r in rows}
+
+def _clients(db: Session, ids) -> Dict[int, dict]:
+    rows = db.query(Client.client_id, Client.name, Client.phone, Client.total_spent)\
+        .filter(Client.client_id.in_(ids))
+    return {r.client_id: {"client_id": r.client_id, "name": r.name, "phone": r.phone, "total_spent": r.total_spent or 0} for r in rows}
+
+_LOADERS = {"bill": load_bills, "product": _products, "client": _clients}
+
+def read_changes(db: Session, since: int, limit: int) -> Tuple[List[dict], int, bool]:
+    """Changes after seq `since` as (entries, last_seq, has_more).
+
+    An entity changed several times within the page is reported once, at its latest
+    seq, with its current state; `op` is that latest operation.
+    """
+    rows = db.query(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op, ChangeLog.changed_at)\
+        .filter(ChangeLog.seq > since)\
+        .order_by(ChangeLog.seq.asc())\
+        .limit(limit + 1)\
+        .all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], since, False
+
+    latest = {}
+    for row in rows:
+        latest[(row.entity, row.entity_id)] = row
+    ids: Dict[str, List[int]] = {}
+    for entity, entity_id in latest:
+        ids.setdefault(entity, []).append(entity_id)
+    data = {entity: _LOADERS[entity](db, entity_ids) for entity, entity_ids in ids.items() if entity in _LOADERS}
+
+    entries = [
+        {
+            "seq": row.seq,
+            "entity": row.entity,
+            "id": row.entity_id,
+            "op": row.op,
+            "changed_at": row.changed_at.isoformat(),
+            "data": data.get(row.entity, {}).get(row.entity_id),
+        }
+        for row in sorted(latest.values(), key=lambda r: r.seq)
+    ]
+    return entries, rows[-1].seq, has_more
+
+def prune(db: Session, keep_days: int) -> int:
+    """Delete feed entries older than keep_days; consumers further behind must do a full reload."""
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    # seq follows commit order, so everything below the first recent seq is old
+    first_kept = db.query(func.min(ChangeLog.seq)).filter(ChangeLog.changed_at >= cutoff).scalar()
+    q = db.query(ChangeLog)
+    q = q.filter(ChangeLog.seq < first_kept) if first_kept is not None else q.filter(ChangeLog.changed_at < cutoff)
+    deleted = q.delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def oldest_seq(db: Session) -> Optional[int]:
+    return db.query(func.min(ChangeLog.seq)).scalar()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the change feed")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--keep-days", type=int, default=30)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        print(f"deleted {prune(db, args.keep_days)} change(s)")
+    finally:
+        db.close()
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+
+# -----------------------------
+# Change-feed lock order check
+# Every writer must touch its entity rows before record_changes() locks the
+# change_sequence counter row, in the same order as /bills/create; a writer that takes
+# the counter first can deadlock against a concurrent checkout. Records the SQL each
+# route sends and fails if the counter upsert comes before the products UPDATE.
+# Usage: python check_change_feed_order.py   (uses a throwaway SQLite database)
+# -----------------------------
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "change_feed_order.sqlite"))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+from database import SessionLocal, engine
+from models import User
+from security import get_password_hash
+
+statements = []
+
+@event.listens_for(engine, "before_cursor_execute")
+def _record(conn, cursor, statement, parameters, context, executemany):
+    statements.append(" ".join(statement.split()).upper())
+
+def first(prefix):
+    return next((i for i, s in enumerate(statements) if s.startswith(prefix)), None)
+
+def check(name, call):
+    statements.clear()
+    resp = call()
+    if resp.status_code != 200:
+        return f"{name}: HTTP {resp.status_code} {resp.text}"
+    product_update = first("UPDATE PRODUCTS")
+    counter = first("INSERT INTO CHANGE_SEQUENCE")
+    if product_update is None or counter is None:
+        return f"{name}: expected both a products UPDATE and a change_sequence upsert"
+    if counter < product_update:
+        return f"{name}: change_sequence locked before the products row"
+    return None
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    db.add(User(username="order-check", hashed_password=get_password_hash("order-check"), role="admin"))
+    db.commit()
+    db.close()
+
+    client = TestClient(main.app)
+    token = client.post("/auth/login", json={"username": "order-check", "password": "order-check"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    pid = client.post("/products/add", json={"name": "Pen", "price": 2, "stock": 100}, headers=headers).json()["product_id"]
+
+    calls = [
+        ("bills/create", lambda: client.post("/bills/create", json={"client_name": "x", "items": [{"product_id": pid, "quantity": 1, "price": 2}]}, headers=headers)),
+        ("products/update_price", lambda: client.post("/products/update_price", json={"product_id": pid, "new_price": 3}, headers=headers)),
+        ("products/update_stock", lambda: client.post("/products/update_stock", json={"product_id": pid, "new_stock": 50}, headers=headers)),
+        ("products/delete", lambda: client.delete(f"/products/{pid}", headers=headers)),
+        ("products/restore", lambda: client.post(f"/products/restore/{pid}", headers=headers)),
+        ("products/bulk_update", lambda: client.post("/products/bulk_update", json=[{"product_id": pid, "price": 4}], headers=headers)),
+    ]
+    failures = [f for f in (check(name, call) for name, call in calls) if f]
+    for name, _ in calls:
+        print(("❌ " if any(f.startswith(name + ":") for f in failures) else "✅ ") + name)
+    for f in failures:
+        print("  " + f)
+    sys.exit(1 if failures else 0)
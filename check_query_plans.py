@@ -0,0 +1,85 @@
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, text
+
+from database import SessionLocal, engine
+from models import Bill, BillItem, Client
+
+# -----------------------------
+# Query-plan regression check
+# EXPLAINs the hot queries against DATABASE_URL (Postgres) and fails if one of them
+# cannot use its index. Sequential scans are disabled for the check so the result
+# doesn't depend on table size: a Seq Scan here means no usable index exists.
+# Usage: DATABASE_URL=postgresql://... python check_query_plans.py
+# -----------------------------
+def hot_queries(db):
+    now = datetime.utcnow()
+    month_start = now - timedelta(days=30)
+    return [
+        (
+            "bills list (keyset page)",
+            "ix_bills_date_bill_id",
+            db.query(Bill.bill_id, Bill.date).filter(Bill.date < now).order_by(Bill.date.desc(), Bill.bill_id.desc()).limit(100),
+        ),
+        (
+            "export / analytics date range",
+            "ix_bills_date_bill_id",
+            db.query(Bill.bill_id).filter(Bill.date >= month_start, Bill.date < now).order_by(Bill.date.asc(), Bill.bill_id.asc()),
+        ),
+        (
+            "client history",
+            "ix_bills_client_id_date",
+            db.query(Bill).filter(Bill.client_id == 1).order_by(Bill.date.desc()),
+        ),
+        (
+            "bill detail items",
+            "ix_bill_items_bill_id_product_id",
+            db.query(BillItem).filter(BillItem.bill_id == 1),
+        ),
+        (
+            "client lookup by name",
+            "ix_clients_name",
+            db.query(Client).filter(Client.name == "walk-in"),
+        ),
+        (
+            "client search (name prefix)",
+            "ix_clients_name_lower_prefix",
+            db.query(Client.client_id).filter(func.lower(Client.name).like("ali%")),
+        ),
+        (
+            "client search (fuzzy name)",
+            "ix_clients_name_lower_trgm",
+            db.query(Client.client_id).filter(func.lower(Client.name).op("%")("alli")),
+        ),
+    ]
+
+def index_names(plan: dict) -> set:
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= index_names(child)
+    return names
+
+def main() -> int:
+    if engine.dialect.name != "postgresql":
+        print("check_query_plans.py needs a Postgres DATABASE_URL")
+        return 2
+    failures = 0
+    db = SessionLocal()
+    try:
+        conn = db.connection()
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for label, expected, query in hot_queries(db):
+            compiled = query.statement.compile(dialect=conn.dialect)
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()[0]["Plan"]
+            used = index_names(plan)
+            ok = expected in used
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {label:<32} expected {expected}, plan uses {sorted(used) or 'no index'}")
+    finally:
+        db.rollback()
+        db.close()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
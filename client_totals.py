@@ -0,0 +1,85 @@
+import argparse
+from typing import Dict, List
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from models import Bill, Client
+from changes import record_changes
+
+# -----------------------------
+# Denormalized clients.total_spent
+# Checkouts apply atomic SQL increments (never read-modify-write in Python), as the
+# last statement before commit so the client row stays locked as briefly as possible.
+# reconcile() recomputes the value from bills and reports/fixes any drift.
+# -----------------------------
+RECONCILE_BATCH_SIZE = 1000
+DRIFT_TOLERANCE = 0.005
+
+def add_spent(db: Session, spent: Dict[int, float]):
+    if not spent:
+        return
+    amount = case(spent, value=Client.client_id)
+    db.query(Client).filter(Client.client_id.in_(list(spent)))\
+        .update({Client.total_spent: func.coalesce(Client.total_spent, 0) + amount}, synchronize_session=False)
+
+def _billed_totals(db: Session, client_ids) -> Dict[int, float]:
+    rows = db.query(Bill.client_id, func.sum(Bill.final_amount))\
+        .filter(Bill.client_id.in_(client_ids))\
+        .group_by(Bill.client_id)
+    return {client_id: total or 0 for client_id, total in rows}
+
+def find_drift(db: Session, tolerance: float = DRIFT_TOLERANCE):
+    billed = select(Bill.client_id, func.sum(Bill.final_amount).label("billed"))\
+        .group_by(Bill.client_id)\
+        .subquery()
+    expected = func.coalesce(billed.c.billed, 0)
+    stored = func.coalesce(Client.total_spent, 0)
+    return db.query(Client.client_id, Client.name, stored.label("stored"), expected.label("expected"))\
+        .outerjoin(billed, billed.c.client_id == Client.client_id)\
+        .filter(func.abs(stored - expected) > tolerance)\
+        .order_by(Client.client_id.asc())\
+        .all()
+
+def reconcile(db: Session, fix: bool = False, tolerance: float = DRIFT_TOLERANCE) -> List[dict]:
+    """Compare total_spent with the sum of the client's bills; with fix=True, rewrite drifted rows."""
+    drifted = [
+        {"client_id": r.client_id, "name": r.name, "stored": r.stored, "expected": r.expected, "drift": r.stored - r.expected}
+        for r in find_drift(db, tolerance)
+    ]
+    db.rollback()
+    if not fix:
+        return drifted
+
+    ids = [d["client_id"] for d in drifted]
+    for offset in range(0, len(ids), RECONCILE_BATCH_SIZE):
+        batch = ids[offset:offset + RECONCILE_BATCH_SIZE]
+        # Lock the rows first (checkouts for these clients wait), then re-read the sums in a
+        # fresh statement so bills committed while we waited for the locks are included
+        db.query(Client.client_id).filter(Client.client_id.in_(batch)).order_by(Client.client_id.asc()).with_for_update().all()
+        totals = _billed_totals(db, batch)
+        amount = case({cid: totals.get(cid, 0) for cid in batch}, value=Client.client_id)
+        db.query(Client).filter(Client.client_id.in_(batch))\
+            .update({Client.total_spent: amount}, synchronize_session=False)
+        record_changes(db, [("client", cid, "update") for cid in batch])
+        db.commit()
+    return drifted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check clients.total_spent against the bills table")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.add_argument("--fix", action="store_true", help="rewrite drifted totals (default: report only)")
+    parser.add_argument("--tolerance", type=float, default=DRIFT_TOLERANCE)
+    parser.add_argument("--show", type=int, default=20, help="drifted clients to print")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        drifted = reconcile(db, fix=args.fix, tolerance=args.tolerance)
+    finally:
+        db.close()
+    for d in drifted[:args.show]:
+        print(f"client {d['client_id']:>8} {d['name'][:30]:<30} stored {d['stored']:>14.2f} expected {d['expected']:>14.2f} drift {d['drift']:>+12.2f}")
+    total = sum(d["drift"] for d in drifted)
+    print(f"{len(drifted)} client(s) drifted, net drift {total:+.2f}" + (" (fixed)" if args.fix and drifted else ""))
@@ -1,6 +1,21 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from fastapi.concurrency import run_in_threadpool
 import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from fastapi import Request
+import hashlib
+from typing import Optional
+from cache import TTLCache
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 Base = declarative_base()
@@ -8,9 +23,147 @@ Base = declarative_base()
 engine = None
 SessionLocal = None
 
+# -----------------------------
+# Pool config
+# Either set DB_POOL_SIZE / DB_MAX_OVERFLOW directly (per engine), or give the
+# server's connection budget in DB_MAX_CONNECTIONS: it is split across the
+# WEB_CONCURRENCY worker processes and every engine each worker opens against that
+# server, and each share covers pool_size + max_overflow, so the total stays within
+# the budget. The replica is a separate server (DB_REPLICA_MAX_CONNECTIONS,
+# defaulting to DB_MAX_CONNECTIONS).
+# -----------------------------
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_MAX_CONNECTIONS = os.getenv("DB_MAX_CONNECTIONS")
+DB_REPLICA_MAX_CONNECTIONS = os.getenv("DB_REPLICA_MAX_CONNECTIONS") or DB_MAX_CONNECTIONS
+ASYNC_ROUTERS = {name.strip() for name in os.getenv("DB_ASYNC_ROUTERS", "").split(",") if name.strip()}
+# The async engine only opens connections when some router is served through it
+PRIMARY_ENGINES = 2 if ASYNC_ROUTERS else 1
+
+def _pool_budget(max_connections: Optional[str], engines: int):
+    """(pool_size, max_overflow) for one engine out of a per-server connection budget."""
+    if not max_connections:
+        return int(os.getenv("DB_POOL_SIZE", "5")), int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    share = max(1, int(max_connections) // (WEB_CONCURRENCY * engines))
+    pool_size = int(os.getenv("DB_POOL_SIZE") or max(1, share * 2 // 3))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW") or max(0, share - pool_size))
+    return pool_size, max_overflow
+
+DB_POOL_SIZE, DB_MAX_OVERFLOW = _pool_budget(DB_MAX_CONNECTIONS, PRIMARY_ENGINES)
+DB_REPLICA_POOL_SIZE, DB_REPLICA_MAX_OVERFLOW = _pool_budget(DB_REPLICA_MAX_CONNECTIONS, 1)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "true")
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.max_overflow = None
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def attach(self, pool, max_overflow: Optional[int] = None):
+        self.max_overflow = max_overflow
+        @event.listens_for(pool, "connect")
+        def _connect(dbapi_conn, record):
+            with self._lock:
+                self.connects += 1
+
+        @event.listens_for(pool, "checkout")
+        def _checkout(dbapi_conn, record, proxy):
+            with self._lock:
+                self.checked_out += 1
+                self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+                if hasattr(pool, "overflow"):   # NullPool/StaticPool (SQLite) have no overflow
+                    self.peak_overflow = max(self.peak_overflow, pool.overflow())
+
+        @event.listens_for(pool, "checkin")
+        def _checkin(dbapi_conn, record):
+            with self._lock:
+                self.checked_out = max(0, self.checked_out - 1)
+
+        @event.listens_for(pool, "invalidate")
+        def _invalidate(dbapi_conn, record, exc):
+            with self._lock:
+                self.invalidations += 1
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            return {
+                "pool_size": pool.size() if hasattr(pool, "size") else None,
+                "max_overflow": self.max_overflow,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "overflow": max(0, pool.overflow()) if hasattr(pool, "overflow") else None,
+                "peak_overflow": self.peak_overflow,
+                "checkouts": self.checkouts,
+                "checkout_wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "checkout_wait_max_ms": round(self.wait_max * 1000, 3),
+                "checkout_timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+            }
+
+class _TimedCheckout:
+    # Pool events fire after a connection is handed out, so the wait itself is timed here
+    stats: PoolStats = None
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_wait(time.perf_counter() - t0, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - t0)
+        return conn
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    stats = PoolStats()
+
+class InstrumentedAsyncPool(_TimedCheckout, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+class InstrumentedReplicaPool(_TimedCheckout, QueuePool):
+    stats = PoolStats()
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _pool_kwargs(url: str, poolclass, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW) -> dict:
+    if _is_sqlite(url):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
 if DATABASE_URL:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, **_pool_kwargs(DATABASE_URL, InstrumentedQueuePool))
     SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    InstrumentedQueuePool.stats.attach(engine.pool, None if _is_sqlite(DATABASE_URL) else DB_MAX_OVERFLOW)
 else:
     raise RuntimeError("DATABASE_URL is not set")
 
@@ -21,4 +174,261 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# -----------------------------
+# Slow-query log
+# Statements slower than SLOW_QUERY_MS land in a ring buffer (served at /admin/db/slow_queries)
+# together with the route that issued them and, optionally, their EXPLAIN plan.
+# -----------------------------
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+SLOW_QUERY_EXPLAIN = _env_bool("SLOW_QUERY_EXPLAIN", "false")
+
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+def _redact(statement: str) -> str:
+    # Values normally travel as bind parameters (never logged); this catches inline string literals
+    return _STRING_LITERAL.sub("'?'", statement)
+
+def _explain(conn, statement, parameters):
+    # Raw DBAPI cursor inside a savepoint: no engine events fire, and a failing EXPLAIN
+    # cannot abort the request's transaction
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute("EXPLAIN (ANALYZE off) " + statement, parameters)
+            plan = [row[0] for row in cursor.fetchall()]
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return [f"EXPLAIN failed: {e.__class__.__name__}"]
+    finally:
+        cursor.close()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _slow_query_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _slow_query_check(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    from metrics import current_request
+    request = current_request.get()
+    plan = None
+    if SLOW_QUERY_EXPLAIN and not executemany and conn.dialect.name == "postgresql" and _EXPLAINABLE.match(statement):
+        plan = _explain(conn, statement, parameters)
+    slow_queries.append({
+        "at": datetime.utcnow().isoformat(),
+        "route": request.route if request is not None else None,
+        "method": request.scope["method"] if request is not None else None,
+        "duration_ms": round(elapsed_ms, 3),
+        "statement": _redact(statement),
+        "executemany": executemany,
+        "plan": plan,
+    })
+
+# -----------------------------
+# Async engine (asyncpg), used by routers listed in DB_ASYNC_ROUTERS
+# -----------------------------
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def _async_url(url: str) -> str:
+    u = make_url(url)
+    return u.set(drivername=_ASYNC_DRIVERS.get(u.get_backend_name(), u.drivername)).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+async_engine = None
+AsyncSessionLocal = None
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_kwargs(ASYNC_DATABASE_URL, InstrumentedAsyncPool))
+    InstrumentedAsyncPool.stats.attach(async_engine.sync_engine.pool, None if _is_sqlite(ASYNC_DATABASE_URL) else DB_MAX_OVERFLOW)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+except ImportError:
+    # async driver not installed; every router stays on the sync engine
+    if ASYNC_ROUTERS:
+        raise RuntimeError(f"DB_ASYNC_ROUTERS is set but the async driver for {ASYNC_DATABASE_URL!r} is not installed")
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database session not initialized")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def db_for(router_name: str):
+    """Session dependency for a router: AsyncSession when listed in DB_ASYNC_ROUTERS, sync Session otherwise."""
+    return get_async_db if router_name in ASYNC_ROUTERS else get_db
+
+def pool_status() -> dict:
+    status = {"sync": InstrumentedQueuePool.stats.snapshot(engine.pool)}
+    if async_engine is not None:
+        status["async"] = InstrumentedAsyncPool.stats.snapshot(async_engine.sync_engine.pool)
+    if replica_engine is not None:
+        status["replica"] = InstrumentedReplicaPool.stats.snapshot(replica_engine.pool)
+    return status
+
+async def run_db(db, fn, *args):
+    """Run fn(session, *args) without holding a worker thread while Postgres answers in async mode.
+
+    Query code stays plain sync ORM either way: AsyncSession.run_sync drives it over asyncpg,
+    a sync Session is pushed to the threadpool exactly as a sync handler would be.
+    """
+    if AsyncSessionLocal is not None and isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+# -----------------------------
+# Read replica
+# Routers listed in DB_READ_ROUTERS read through get_read_db / read_session, which use
+# DATABASE_REPLICA_URL while the replica answers and lags less than REPLICA_MAX_LAG_SECONDS,
+# and the primary otherwise. A caller that committed a write is pinned to the primary for
+# REPLICA_STICKY_SECONDS, so it reads its own writes (e.g. a bill right after create_bill).
+# Caches invalidated on primary commits must not store replica reads (see on_replica):
+# the catalog stays on the primary, the analytics summary only caches primary reads.
+# -----------------------------
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+READ_ROUTERS = {name.strip() for name in os.getenv("DB_READ_ROUTERS", "analytics,export,bills,clients,changes").split(",") if name.strip()}
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", str(max(REPLICA_MAX_LAG_SECONDS, 5))))
+
+replica_engine = None
+ReplicaSessionLocal = None
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(DATABASE_REPLICA_URL, **_pool_kwargs(DATABASE_REPLICA_URL, InstrumentedReplicaPool, DB_REPLICA_POOL_SIZE, DB_REPLICA_MAX_OVERFLOW))
+    ReplicaSessionLocal = sessionmaker(bind=replica_engine, autocommit=False, autoflush=False)
+    InstrumentedReplicaPool.stats.attach(replica_engine.pool, None if _is_sqlite(DATABASE_REPLICA_URL) else DB_REPLICA_MAX_OVERFLOW)
+
+# Zero when the standby has replayed everything it received, so an idle primary doesn't read as lag
+_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaMonitor:
+    def __init__(self):
+        self.healthy = False
+        self.lag_seconds = None
+        self.last_error = None
+        self.checked_at = None
+        self.checks = 0
+        self.routed = {"replica": 0, "primary_unhealthy": 0, "primary_lagging": 0, "primary_sticky": 0}
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._checking = threading.Lock()
+
+    def _check(self):
+        try:
+            with replica_engine.connect() as conn:
+                lag = float(conn.execute(_LAG_SQL).scalar()) if conn.dialect.name == "postgresql" else 0.0
+            self.healthy, self.lag_seconds, self.last_error = True, lag, None
+        except Exception as e:
+            self.healthy, self.lag_seconds, self.last_error = False, None, f"{e.__class__.__name__}: {e}"
+        self.checked_at = datetime.utcnow().isoformat()
+        self.checks += 1
+
+    def usable(self) -> str:
+        """'replica' or the reason reads go to the primary. At most one caller re-checks at a time."""
+        now = time.monotonic()
+        if now >= self._next_check and self._checking.acquire(blocking=False):
+            try:
+                self._next_check = now + REPLICA_CHECK_INTERVAL_SECONDS
+                self._check()
+            finally:
+                self._checking.release()
+        if not self.healthy:
+            return "primary_unhealthy"
+        if self.lag_seconds > REPLICA_MAX_LAG_SECONDS:
+            return "primary_lagging"
+        return "replica"
+
+    def record(self, route: str):
+        with self._lock:
+            self.routed[route] += 1
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "configured": replica_engine is not None,
+                "healthy": self.healthy,
+                "lag_seconds": self.lag_seconds,
+                "max_lag_seconds": REPLICA_MAX_LAG_SECONDS,
+                "last_error": self.last_error,
+                "checked_at": self.checked_at,
+                "checks": self.checks,
+                "routed": dict(self.routed),
+                "sticky_callers": _recent_writers.stats()["size"],
+            }
+
+replica_monitor = ReplicaMonitor()
+
+_recent_writers = TTLCache(maxsize=100_000, ttl=REPLICA_STICKY_SECONDS)
+
+def _caller_key(authorization: Optional[str]) -> Optional[str]:
+    # Callers are told apart by their bearer token; only a digest of it is kept
+    return hashlib.sha256(authorization.encode()).hexdigest()[:32] if authorization else None
+
+@event.listens_for(Session, "after_flush")
+def _note_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_dml(orm_execute_state):
+    # insert()/update() executed directly (bulk paths) never flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(Session, "after_commit")
+def _pin_writer(session):
+    if not session.info.pop("wrote", False) or replica_engine is None:
+        return
+    from metrics import current_request
+    request = current_request.get()
+    key = _caller_key(dict(request.scope["headers"]).get(b"authorization", b"").decode("latin-1")) if request is not None else None
+    if key:
+        _recent_writers.set(key, True)
+
+def _read_target(key: Optional[str]) -> str:
+    if replica_engine is None:
+        return "primary"
+    if key and _recent_writers.get(key):
+        route = "primary_sticky"
+    else:
+        route = replica_monitor.usable()
+    replica_monitor.record(route)
+    return route
+
+def read_session(authorization: Optional[str] = None):
+    """New Session on the replica when it is usable for this caller, else on the primary."""
+    if _read_target(_caller_key(authorization)) == "replica":
+        return ReplicaSessionLocal()
+    return SessionLocal()
+
+def get_read_db(request: Request):
+    db = read_session(request.headers.get("authorization"))
+    try:
+        yield db
+    finally:
+        db.close()
+
+def on_replica(db) -> bool:
+    """True when db reads from the replica, i.e. its results may lag the primary."""
+    return replica_engine is not None and isinstance(db, Session) and db.get_bind() is replica_engine
+
+def read_db_for(router_name: str):
+    """Session dependency for read-only endpoints: replica-aware when the router is in DB_READ_ROUTERS."""
+    if replica_engine is not None and router_name in READ_ROUTERS:
+        return get_read_db
+    return db_for(router_name)
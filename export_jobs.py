@@ -0,0 +1,238 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+# -----------------------------
+# Config
+# -----------------------------
+EXPORT_SPOOL_DIR = os.getenv("EXPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "billing-exports"))
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+EXPORT_JOB_MAX_PENDING = int(os.getenv("EXPORT_JOB_MAX_PENDING", "32"))       # queued + running
+EXPORT_JOB_TTL_SECONDS = float(os.getenv("EXPORT_JOB_TTL_SECONDS", "3600"))   # finished jobs and their files
+PROGRESS_SAVE_SECONDS = 1.0
+CLEANUP_INTERVAL_SECONDS = 60.0
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+
+# -----------------------------
+# Background export jobs
+# Jobs run on a small thread pool and write their output to the spool directory.
+# Job state is mirrored to <id>.json next to the file, so any worker process on
+# the same host can report status and serve the download.
+# -----------------------------
+@dataclass
+class ExportJob:
+    job_id: str
+    kind: str
+    params: dict
+    key: str
+    status: str = "queued"          # queued | running | done | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    bytes_written: int = 0
+    chunks_written: int = 0
+    filename: Optional[str] = None
+    media_type: Optional[str] = None
+    error: Optional[str] = None
+
+    def public(self) -> dict:
+        data = asdict(self)
+        data.pop("key")
+        data["expires_at"] = self.finished_at + EXPORT_JOB_TTL_SECONDS if self.finished_at else None
+        return data
+
+# prepare(params) validates and normalizes request params (raising HTTPException 400), which also
+# makes equivalent requests dedupe; run(params) returns (filename, media_type, chunks) and is
+# only called on a worker thread. Jobs with nothing to download return (None, None, iterable).
+PrepareFn = Callable[[dict], dict]
+RunFn = Callable[[dict], Tuple[Optional[str], Optional[str], object]]
+
+class JobQueue:
+    def __init__(self, spool_dir: str, workers: int, max_pending: int, ttl: float):
+        self.spool_dir = spool_dir
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.rejected = 0
+        self.deduplicated = 0
+        self._kinds: Dict[str, Tuple[PrepareFn, RunFn]] = {}
+        self._jobs: Dict[str, ExportJob] = {}
+        self._by_key: Dict[str, str] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export-job")
+        self._workers = workers
+        self._lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+        threading.Thread(target=self._cleanup_loop, name="export-job-cleanup", daemon=True).start()
+
+    def register(self, kind: str, prepare: PrepareFn, run: RunFn):
+        self._kinds[kind] = (prepare, run)
+
+    def kinds(self):
+        return sorted(self._kinds)
+
+    # ---------- paths / persistence ----------
+    def data_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.data")
+
+    def _meta_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def _save(self, job: ExportJob):
+        tmp = self._meta_path(job.job_id) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(asdict(job), f)
+        os.replace(tmp, self._meta_path(job.job_id))
+
+    def _expired(self, job: ExportJob, now: float) -> bool:
+        return job.finished_at is not None and now - job.finished_at > self.ttl
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            # Started by another worker process on this host
+            try:
+                with open(self._meta_path(os.path.basename(job_id))) as f:
+                    job = ExportJob(**json.load(f))
+            except (OSError, ValueError, TypeError):
+                return None
+        # Expired jobs are gone even if the next cleanup pass hasn't removed them yet
+        return None if self._expired(job, time.time()) else job
+
+    # ---------- submit / run ----------
+    def submit(self, kind: str, params: dict) -> Tuple[ExportJob, bool]:
+        """Returns (job, created); an identical queued or running job is reused, finished ones never are."""
+        if kind not in self._kinds:
+            raise HTTPException(status_code=400, detail=f"Unknown export kind '{kind}'")
+        params = self._kinds[kind][0](params)
+        self.cleanup()
+        key = kind + ":" + json.dumps(params, sort_keys=True, default=str)
+        with self._lock:
+            existing = self._jobs.get(self._by_key.get(key, ""))
+            if existing is not None and existing.status in ("queued", "running"):
+                self.deduplicated += 1
+                return existing, False
+            pending = sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+            if pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Export queue is full, please retry later")
+            job = ExportJob(job_id=uuid.uuid4().hex, kind=kind, params=params, key=key)
+            self._jobs[job.job_id] = job
+            self._by_key[key] = job.job_id
+        self._save(job)
+        self._executor.submit(self._run, job)
+        return job, True
+
+    def _run(self, job: ExportJob):
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        part = self.data_path(job.job_id) + ".part"
+        try:
+            job.filename, job.media_type, chunks = self._kinds[job.kind][1](job.params)
+            if job.filename:
+                last_save = time.monotonic()
+                with open(part, "wb") as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                        job.bytes_written += len(chunk)
+                        job.chunks_written += 1
+                        if time.monotonic() - last_save >= PROGRESS_SAVE_SECONDS:
+                            self._save(job)
+                            last_save = time.monotonic()
+                os.replace(part, self.data_path(job.job_id))
+            else:
+                for _ in chunks:
+                    pass
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{e.__class__.__name__}: {e}"
+            if os.path.exists(part):
+                os.remove(part)
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+
+    # ---------- housekeeping ----------
+    def cleanup(self):
+        now = time.time()
+        with self._lock:
+            expired = [j for j in self._jobs.values() if self._expired(j, now)]
+            for job in expired:
+                del self._jobs[job.job_id]
+                if self._by_key.get(job.key) == job.job_id:
+                    del self._by_key[job.key]
+            live = tuple(self._jobs)
+        # Also sweeps files left behind by other processes or by a restart
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl and not name.startswith(live):
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _cleanup_loop(self):
+        while True:
+            time.sleep(min(self.ttl, CLEANUP_INTERVAL_SECONDS))
+            try:
+                self.cleanup()
+            except Exception:
+                pass   # a failed sweep is retried on the next tick
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {
+                "workers": self._workers,
+                "max_pending": self.max_pending,
+                "jobs": by_status,
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected,
+                "spool_dir": self.spool_dir,
+            }
+
+export_jobs = JobQueue(EXPORT_SPOOL_DIR, EXPORT_JOB_WORKERS, EXPORT_JOB_MAX_PENDING, EXPORT_JOB_TTL_SECONDS)
+
+# -----------------------------
+# HTTP Range helper for downloads
+# -----------------------------
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Single 'bytes=a-b' / 'bytes=a-' / 'bytes=-n' range -> inclusive (start, end); None = whole file."""
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None   # unsupported forms fall back to a full 200 response
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+def iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_BYTES, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
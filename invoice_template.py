@@ -0,0 +1,73 @@
+from html import escape
+from typing import List, Tuple
+
+# -----------------------------
+# Invoice HTML template
+# Parsed once at import; kept free of app/DB imports so render workers load it cheaply.
+# -----------------------------
+_ROW = (
+    "<tr><td>{name}</td>"
+    "<td style='text-align:right'>{quantity}</td>"
+    "<td style='text-align:right'>{price:.2f}</td>"
+    "<td style='text-align:right'>{subtotal:.2f}</td></tr>"
+)
+
+_PAGE = """
+    <html>
+    <head>
+      <title>Invoice #{bill_id}</title>
+      <style>
+        body {{ font-family: Arial, sans-serif; margin: 24px; }}
+        h1 {{ margin-bottom: 4px; }}
+        .meta {{ margin-bottom: 16px; color: #444; }}
+        table {{ width: 100%; border-collapse: collapse; }}
+        th, td {{ border-bottom: 1px solid #ddd; padding: 8px; }}
+        th {{ text-align: left; background: #f7f7f7; }}
+        .totals td {{ font-weight: bold; }}
+      </style>
+    </head>
+    <body>
+      <h1>Invoice #{bill_id}</h1>
+      <div class="meta">
+        <div><strong>Date:</strong> {date}</div>
+        <div><strong>Client:</strong> {client_name}</div>
+        <div><strong>Phone:</strong> {client_phone}</div>
+      </div>
+      <table>
+        <thead>
+          <tr><th>Product</th><th style="text-align:right">Qty</th><th style="text-align:right">Price</th><th style="text-align:right">Subtotal</th></tr>
+        </thead>
+        <tbody>
+          {rows}
+          <tr class="totals"><td colspan="3" style="text-align:right">Total</td><td style="text-align:right">{total_amount:.2f}</td></tr>
+          <tr class="totals"><td colspan="3" style="text-align:right">Discount</td><td style="text-align:right">-{discount:.2f}</td></tr>
+          <tr class="totals"><td colspan="3" style="text-align:right">Final</td><td style="text-align:right">{final_amount:.2f}</td></tr>
+        </tbody>
+      </table>
+    </body>
+    </html>
+    """
+
+_render_row = _ROW.format
+_render_page = _PAGE.format
+
+def render_invoice(bill: dict) -> str:
+    """bill is the dict shape produced by bill_cache.load_bill."""
+    rows = "".join(
+        _render_row(name=escape(item["name"] or ""), quantity=item["quantity"], price=item["price"], subtotal=item["subtotal"])
+        for item in bill["items"]
+    )
+    return _render_page(
+        bill_id=bill["bill_id"],
+        date=bill["date"],
+        client_name=escape(bill["client_name"]),
+        client_phone=escape(bill["client_phone"]),
+        rows=rows,
+        total_amount=bill["total_amount"],
+        discount=bill["discount"],
+        final_amount=bill["final_amount"],
+    )
+
+def render_batch(bills: List[dict]) -> List[Tuple[str, str]]:
+    """Worker entry point: [(zip entry name, html), ...] in input order."""
+    return [(f"invoice_{bill['bill_id']}.html", render_invoice(bill)) for bill in bills]
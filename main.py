@@ -1,13 +1,15 @@
 import os
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from passlib.context import CryptContext
 
 # Import routers directly from routes folder (since you run inside backend/)
-from routes import auth, products, bills, clients, analytics, export, invoice
+from routes import auth, products, bills, clients, analytics, export, invoice, admin, changes
 
 # Import DB setup from database.py
 from database import Base, engine
+from metrics import MetricsMiddleware, registry
 
 # -----------------------------
 # Config
@@ -32,6 +34,8 @@ app.include_router(clients.router)
 app.include_router(analytics.router)
 app.include_router(export.router)
 app.include_router(invoice.router)
+app.include_router(admin.router)
+app.include_router(changes.router)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -42,6 +46,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 # -----------------------------
 # Create tables on startup
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# -----------------------------
+# Config
+# -----------------------------
+# Adds X-Query-Count and Server-Timing headers to every response (debugging only)
+METRICS_DEBUG_HEADERS = os.getenv("METRICS_DEBUG_HEADERS", "false").lower() in ("1", "true", "yes", "on")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+# -----------------------------
+# Per-request SQL accounting
+# -----------------------------
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_time")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+
+    @property
+    def route(self) -> Optional[str]:
+        # Starlette writes the matched route into the scope before the endpoint runs
+        route = self.scope.get("route")
+        return route.path if route is not None else None
+
+# Holds a mutable RequestStats so threadpool/greenlet copies of the context share it
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+
+# -----------------------------
+# Registry
+# -----------------------------
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}        # (method, route, status) -> count
+        self.latency = {}         # (method, route) -> _Histogram
+        self.size = {}            # (method, route) -> _Histogram
+        self.query_count = {}     # (method, route) -> _Histogram
+        self.db_time = {}         # (method, route) -> seconds
+
+    def observe(self, method: str, route: str, status: int, seconds: float, size: int, queries: int, db_time: float):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.latency.setdefault(key, _Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.size.setdefault(key, _Histogram(SIZE_BUCKETS)).observe(size)
+            self.query_count.setdefault(key, _Histogram(QUERY_COUNT_BUCKETS)).observe(queries)
+            self.db_time[key] = self.db_time.get(key, 0.0) + db_time
+
+    def render(self) -> str:
+        lines = []
+
+        def labels(**kw):
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kw.items()) + "}"
+
+        def histogram(name, help_text, series):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), h in sorted(series.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{labels(method=method, route=route, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{labels(method=method, route=route)} {h.sum}")
+                lines.append(f"{name}_count{labels(method=method, route=route)} {h.count}")
+
+        with self._lock:
+            lines.append("# HELP http_requests_total Requests by route and status")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), n in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{labels(method=method, route=route, status=status)} {n}")
+            histogram("http_request_duration_seconds", "Request latency until the last body byte", self.latency)
+            histogram("http_response_size_bytes", "Response body size", self.size)
+            histogram("http_request_db_queries", "SQL statements executed per request", self.query_count)
+            lines.append("# HELP http_request_db_seconds_total Time spent in SQL statements")
+            lines.append("# TYPE http_request_db_seconds_total counter")
+            for (method, route), seconds in sorted(self.db_time.items()):
+                lines.append(f"http_request_db_seconds_total{labels(method=method, route=route)} {seconds}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# -----------------------------
+# ASGI middleware
+# Plain ASGI rather than BaseHTTPMiddleware so streamed bodies are timed and sized to the end.
+# -----------------------------
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if METRICS_DEBUG_HEADERS:
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-query-count", str(stats.queries).encode()))
+                    headers.append((b"server-timing", f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", app;dur={elapsed_ms:.1f}'.encode()))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            registry.observe(
+                scope["method"],
+                stats.route or "unmatched",
+                status,
+                time.perf_counter() - start,
+                size,
+                stats.queries,
+                stats.db_time,
+            )
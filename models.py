@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base   # ✅ import Base from database.py
@@ -18,6 +18,10 @@ class Client(Base):
     total_spent = Column(Float, default=0)
     bills = relationship("Bill", back_populates="client", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_clients_name", "name"),
+    )
+
 class Product(Base):
     __tablename__ = "products"
     product_id = Column(Integer, primary_key=True, index=True)
@@ -38,13 +42,59 @@ class Bill(Base):
     client = relationship("Client", back_populates="bills")
     items = relationship("BillItem", back_populates="bill", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_bills_date_bill_id", "date", "bill_id"),          # date ranges, keyset listing, exports
+        Index("ix_bills_client_id_date", "client_id", "date"),      # client history, newest first
+    )
+
 class BillItem(Base):
     __tablename__ = "bill_items"
     bill_item_id = Column(Integer, primary_key=True, index=True)
     bill_id = Column(Integer, ForeignKey("bills.bill_id"), nullable=False)
+    bill_date = Column(DateTime, nullable=False)   # copy of bills.date: partition key when bill_items is partitioned
     product_id = Column(Integer, ForeignKey("products.product_id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
     subtotal = Column(Float, nullable=False)
 
-    bill = relationship("Bill", back_populates="items")
\ No newline at end of file
+    bill = relationship("Bill", back_populates="items")
+
+    __table_args__ = (
+        Index("ix_bill_items_bill_id_product_id", "bill_id", "product_id"),   # bill detail / invoice / export joins
+        Index("ix_bill_items_product_id", "product_id"),                      # per-product sales
+    )
+
+# -----------------------------
+# Rollups (maintained by rollups.py)
+# -----------------------------
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+    day = Column(Date, primary_key=True)
+    bill_count = Column(Integer, default=0, nullable=False)
+    gross = Column(Float, default=0, nullable=False)
+    discount = Column(Float, default=0, nullable=False)
+    net = Column(Float, default=0, nullable=False)
+    items_sold = Column(Integer, default=0, nullable=False)
+
+class ProductDailySales(Base):
+    __tablename__ = "product_daily_sales"
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    quantity = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
+
+# -----------------------------
+# Change feed (maintained by changes.py)
+# -----------------------------
+class ChangeSequence(Base):
+    __tablename__ = "change_sequence"
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False)
+
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    seq = Column(BigInteger, primary_key=True, autoincrement=False)
+    entity = Column(String, nullable=False)        # bill | product | client
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)            # create | update | delete
+    changed_at = Column(DateTime, nullable=False)
@@ -0,0 +1,243 @@
+import argparse
+from datetime import date
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# -----------------------------
+# Monthly range partitions for bills / bill_items (Postgres only)
+# The conversion is a standalone command, not a migration, so it can run (and be
+# reverted) at any schema revision without touching the rest of the chain:
+#   python partitions.py convert --confirm
+#   python partitions.py ensure --months-ahead 3
+#   python partitions.py detach --keep-months 24 [--archive-schema archive]
+#   python partitions.py revert --confirm
+# convert/revert rewrite both tables (rename, copy, drop) inside one transaction and
+# have NOT been run against a real Postgres server yet: rehearse them on a restored
+# copy of production (convert, ensure, detach, revert) before using them for real.
+# -----------------------------
+PARTITIONED_TABLES = [("bills", "date"), ("bill_items", "bill_date")]   # parent before child
+MONTHS_AHEAD = 3
+
+# Secondary indexes on both tables (alembic 0001/0003); rebuilt on the new tables
+BILLS_INDEXES = [
+    ("ix_bills_bill_id", "bills", ["bill_id"]),
+    ("ix_bills_date_bill_id", "bills", ["date", "bill_id"]),
+    ("ix_bills_client_id_date", "bills", ["client_id", "date"]),
+    ("ix_bill_items_bill_item_id", "bill_items", ["bill_item_id"]),
+    ("ix_bill_items_bill_id_product_id", "bill_items", ["bill_id", "product_id"]),
+    ("ix_bill_items_product_id", "bill_items", ["product_id"]),
+]
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def month_starts(first: date, last: date) -> List[date]:
+    months = []
+    current = date(first.year, first.month, 1)
+    while current <= last:
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = 'bills'"
+    )).scalar())
+
+def existing_partitions(conn: Connection, table: str) -> List[str]:
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table ORDER BY c.relname"
+    ), {"table": table}).scalars())
+
+def create_month_partitions(conn: Connection, months: List[date]) -> List[str]:
+    created = []
+    for table, _ in PARTITIONED_TABLES:
+        have = set(existing_partitions(conn, table))
+        for month in months:
+            name = partition_name(table, month)
+            if name in have:
+                continue
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+    return created
+
+def drop_foreign_keys(conn: Connection, table: str, referenced: str):
+    # A detached partition keeps the parent's foreign keys as standalone constraints
+    names = conn.execute(text(
+        "SELECT conname FROM pg_constraint "
+        "WHERE contype = 'f' AND conrelid = CAST(:table AS regclass) AND confrelid = CAST(:referenced AS regclass)"
+    ), {"table": table, "referenced": referenced}).scalars().all()
+    for name in names:
+        conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+
+def detach_old_partitions(conn: Connection, keep_months: int, archive_schema: str = None) -> List[str]:
+    cutoff = add_months(date.today().replace(day=1), -keep_months)
+    detached = []
+    # Children first: a bills partition can't be detached while bill_items rows still reference
+    # it, and that includes detached bill_items partitions until their copied FK is dropped
+    parent = PARTITIONED_TABLES[0][0]
+    for table, _ in reversed(PARTITIONED_TABLES):
+        for name in existing_partitions(conn, table):
+            suffix = name[len(table) + 1:]
+            if not (suffix.startswith("y") and len(suffix) == 8):
+                continue   # default partition
+            month = date(int(suffix[1:5]), int(suffix[6:8]), 1)
+            if month >= cutoff:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if table != parent:
+                drop_foreign_keys(conn, name, parent)
+            if archive_schema:
+                conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+                conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+            detached.append(name)
+    return detached
+
+# -----------------------------
+# Convert / revert
+# The primary keys become (bill_id, date) and (bill_item_id, bill_date), because
+# Postgres requires the partition key in every unique constraint; bill_items
+# references bills through (bill_id, bill_date). The id sequences are kept.
+# -----------------------------
+def _swap_out(conn: Connection, suffix: str):
+    # Keep the id sequences alive when the old tables are dropped
+    conn.execute(text("ALTER SEQUENCE bills_bill_id_seq OWNED BY NONE"))
+    conn.execute(text("ALTER SEQUENCE bill_items_bill_item_id_seq OWNED BY NONE"))
+    conn.execute(text(f"ALTER TABLE bill_items RENAME TO bill_items_{suffix}"))
+    conn.execute(text(f"ALTER TABLE bills RENAME TO bills_{suffix}"))
+    # Primary key indexes keep their names across a table rename and would collide with the new tables'
+    conn.execute(text(f"ALTER TABLE bill_items_{suffix} RENAME CONSTRAINT bill_items_pkey TO bill_items_{suffix}_pkey"))
+    conn.execute(text(f"ALTER TABLE bills_{suffix} RENAME CONSTRAINT bills_pkey TO bills_{suffix}_pkey"))
+    for name, _, _ in BILLS_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def _copy_in(conn: Connection, suffix: str):
+    conn.execute(text("ALTER SEQUENCE bills_bill_id_seq OWNED BY bills.bill_id"))
+    conn.execute(text("ALTER SEQUENCE bill_items_bill_item_id_seq OWNED BY bill_items.bill_item_id"))
+    conn.execute(text(f"""
+        INSERT INTO bills (bill_id, client_id, date, total_amount, discount, final_amount)
+        SELECT bill_id, client_id, date, total_amount, discount, final_amount FROM bills_{suffix}
+    """))
+    conn.execute(text(f"""
+        INSERT INTO bill_items (bill_item_id, bill_id, bill_date, product_id, quantity, price, subtotal)
+        SELECT bill_item_id, bill_id, bill_date, product_id, quantity, price, subtotal FROM bill_items_{suffix}
+    """))
+    for name, table, columns in BILLS_INDEXES:
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+    conn.execute(text(f"DROP TABLE bill_items_{suffix}"))
+    conn.execute(text(f"DROP TABLE bills_{suffix}"))
+
+def convert(conn: Connection, months_ahead: int = MONTHS_AHEAD) -> List[str]:
+    _swap_out(conn, "unpartitioned")
+    conn.execute(text("""
+        CREATE TABLE bills (
+            bill_id integer NOT NULL DEFAULT nextval('bills_bill_id_seq'),
+            client_id integer NOT NULL REFERENCES clients (client_id),
+            date timestamp without time zone NOT NULL,
+            total_amount double precision NOT NULL,
+            discount double precision NOT NULL,
+            final_amount double precision NOT NULL,
+            PRIMARY KEY (bill_id, date)
+        ) PARTITION BY RANGE (date)
+    """))
+    conn.execute(text("""
+        CREATE TABLE bill_items (
+            bill_item_id integer NOT NULL DEFAULT nextval('bill_items_bill_item_id_seq'),
+            bill_id integer NOT NULL,
+            bill_date timestamp without time zone NOT NULL,
+            product_id integer NOT NULL REFERENCES products (product_id),
+            quantity integer NOT NULL,
+            price double precision NOT NULL,
+            subtotal double precision NOT NULL,
+            PRIMARY KEY (bill_item_id, bill_date),
+            FOREIGN KEY (bill_id, bill_date) REFERENCES bills (bill_id, date)
+        ) PARTITION BY RANGE (bill_date)
+    """))
+    # One partition per month of history plus a few ahead; DEFAULT catches anything
+    # outside that range if `partitions.py ensure` ever falls behind
+    first = conn.execute(text("SELECT min(date) FROM bills_unpartitioned")).scalar()
+    this_month = date.today().replace(day=1)
+    first_month = first.date().replace(day=1) if first else this_month
+    created = create_month_partitions(conn, month_starts(first_month, add_months(this_month, months_ahead)))
+    conn.execute(text("CREATE TABLE bills_default PARTITION OF bills DEFAULT"))
+    conn.execute(text("CREATE TABLE bill_items_default PARTITION OF bill_items DEFAULT"))
+    _copy_in(conn, "unpartitioned")
+    return created
+
+def revert(conn: Connection):
+    _swap_out(conn, "partitioned")
+    conn.execute(text("""
+        CREATE TABLE bills (
+            bill_id integer NOT NULL DEFAULT nextval('bills_bill_id_seq') PRIMARY KEY,
+            client_id integer NOT NULL REFERENCES clients (client_id),
+            date timestamp without time zone NOT NULL,
+            total_amount double precision NOT NULL,
+            discount double precision NOT NULL,
+            final_amount double precision NOT NULL
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE bill_items (
+            bill_item_id integer NOT NULL DEFAULT nextval('bill_items_bill_item_id_seq') PRIMARY KEY,
+            bill_id integer NOT NULL REFERENCES bills (bill_id),
+            bill_date timestamp without time zone NOT NULL,
+            product_id integer NOT NULL REFERENCES products (product_id),
+            quantity integer NOT NULL,
+            price double precision NOT NULL,
+            subtotal double precision NOT NULL
+        )
+    """))
+    # Dropping the partitioned parents drops every attached partition with them
+    _copy_in(conn, "partitioned")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain monthly bills/bill_items partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ensure = sub.add_parser("ensure", help="pre-create partitions for the coming months")
+    ensure.add_argument("--months-ahead", type=int, default=3)
+    detach = sub.add_parser("detach", help="detach partitions older than the retention window")
+    detach.add_argument("--keep-months", type=int, required=True)
+    detach.add_argument("--archive-schema", default=None, help="move detached partitions into this schema")
+    for name, help_text in [("convert", "rewrite bills/bill_items as monthly partitioned tables"), ("revert", "rewrite them back as plain tables")]:
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--confirm", action="store_true", help="required: rewrites both tables under an exclusive lock")
+    args = parser.parse_args()
+
+    from database import engine
+    with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            raise SystemExit("partitioning is only supported on Postgres")
+        partitioned = is_partitioned(conn)
+        if args.command in ("convert", "revert"):
+            if not args.confirm:
+                raise SystemExit(f"{args.command} rewrites bills and bill_items and has not been verified on Postgres yet; "
+                                 "rehearse it on a copy of production, then re-run with --confirm")
+            if partitioned == (args.command == "convert"):
+                raise SystemExit("bills is already " + ("partitioned" if partitioned else "a plain table"))
+        elif not partitioned:
+            raise SystemExit("bills is not partitioned (run `python partitions.py convert` first)")
+
+        if args.command == "convert":
+            names = convert(conn)
+            print("converted; partitions:", ", ".join(names))
+        elif args.command == "revert":
+            revert(conn)
+            print("reverted to plain tables")
+        elif args.command == "ensure":
+            this_month = date.today().replace(day=1)
+            names = create_month_partitions(conn, month_starts(this_month, add_months(this_month, args.months_ahead)))
+            print("created:", ", ".join(names) or "nothing")
+        else:
+            names = detach_old_partitions(conn, args.keep_months, args.archive_schema)
+            print("detached:", ", ".join(names) or "nothing")
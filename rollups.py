@@ -0,0 +1,167 @@
+import argparse
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from models import Bill, BillItem, DailySales, ProductDailySales
+
+# /analytics/summary results keyed by (start_day, end_day)
+summary_cache = TTLCache(
+    maxsize=int(os.getenv("ANALYTICS_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "60")),
+)
+
+def invalidate_summaries(day: date):
+    """Drop cached summaries whose window covers day. Call after the bill's transaction commits."""
+    summary_cache.invalidate_where(lambda key: key[0] <= day <= key[1])
+
+# -----------------------------
+# Incremental updates
+# -----------------------------
+def _upsert_increment(db: Session, model, rows, keys, columns):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Rollup upsert not supported on {dialect}")
+    stmt = insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={c: getattr(model, c) + getattr(stmt.excluded, c) for c in columns},
+    )
+    db.execute(stmt)
+
+def record_sales(db: Session, day: date, bill_count: int, gross: float, discount: float, net: float,
+                 product_lines: Dict[int, Tuple[int, float]]):
+    """Add freshly created bills to the rollups. Runs inside the caller's transaction.
+
+    product_lines maps product_id -> (quantity, revenue) summed over those bills.
+    """
+    _upsert_increment(
+        db, DailySales,
+        [{"day": day, "bill_count": bill_count, "gross": gross, "discount": discount, "net": net,
+          "items_sold": sum(qty for qty, _ in product_lines.values())}],
+        ["day"], ["bill_count", "gross", "discount", "net", "items_sold"],
+    )
+    # product_id order keeps row-lock acquisition consistent across concurrent checkouts
+    _upsert_increment(
+        db, ProductDailySales,
+        [{"day": day, "product_id": pid, "quantity": qty, "revenue": revenue}
+         for pid, (qty, revenue) in sorted(product_lines.items())],
+        ["day", "product_id"], ["quantity", "revenue"],
+    )
+
+# -----------------------------
+# Backfill / rebuild
+# -----------------------------
+REBUILD_CHUNK_DAYS = int(os.getenv("ROLLUP_REBUILD_CHUNK_DAYS", "31"))
+
+def _first_day(db: Session) -> Optional[date]:
+    # Earliest day with bills or rollup rows, so a full rebuild also clears orphaned rollup days
+    days = [
+        db.query(func.min(Bill.date)).scalar(),
+        db.query(func.min(DailySales.day)).scalar(),
+        db.query(func.min(ProductDailySales.day)).scalar(),
+    ]
+    days = [d.date() if isinstance(d, datetime) else d for d in days if d is not None]
+    return min(days) if days else None
+
+def rebuild(db: Session, start: Optional[date] = None, end: Optional[date] = None, chunk_days: int = REBUILD_CHUNK_DAYS):
+    """Recompute both rollups from bills/bill_items for [start, end] (whole history by default).
+
+    Closed days are rebuilt chunk_days at a time, each chunk in its own short transaction and
+    without blocking checkouts; only the live tail is rebuilt under a table lock.
+    """
+    # Bills are dated with utcnow(); a checkout that started just before midnight can still
+    # commit a bill for yesterday, so yesterday onwards is live
+    live_from = datetime.utcnow().date() - timedelta(days=1)
+    closed_end = min(end, live_from - timedelta(days=1)) if end else live_from - timedelta(days=1)
+    day = start or _first_day(db)
+    while day is not None and day <= closed_end:
+        chunk_end = min(day + timedelta(days=chunk_days - 1), closed_end)
+        _rebuild_range(db, day, chunk_end)
+        db.commit()
+        day = chunk_end + timedelta(days=1)
+
+    if end is None or end >= live_from:
+        if db.get_bind().dialect.name == "postgresql":
+            # Blocks create_bill's upserts until the rebuilt rows are committed, so no bill is lost or counted twice
+            db.execute(text("LOCK TABLE daily_sales, product_daily_sales IN EXCLUSIVE MODE"))
+        _rebuild_range(db, max(start, live_from) if start else live_from, end)
+        db.commit()
+    summary_cache.clear()
+
+def _rebuild_range(db: Session, start: Optional[date], end: Optional[date]):
+    # Delete + re-insert [start, end] inside the caller's transaction
+    bill_day = func.date(Bill.date)
+
+    def days_in_range(q, day_col):
+        if start:
+            q = q.where(day_col >= start)
+        if end:
+            q = q.where(day_col <= end)
+        return q
+
+    def bills_in_range(q, with_items=False):
+        # Bounds on the raw timestamps (not date(...)) so indexes and partition pruning apply
+        lo = datetime.combine(start, time.min) if start else None
+        hi = datetime.combine(end + timedelta(days=1), time.min) if end else None
+        for col in ([Bill.date, BillItem.bill_date] if with_items else [Bill.date]):
+            if lo:
+                q = q.where(col >= lo)
+            if hi:
+                q = q.where(col < hi)
+        return q
+
+    db.execute(days_in_range(DailySales.__table__.delete(), DailySales.day))
+    db.execute(days_in_range(ProductDailySales.__table__.delete(), ProductDailySales.day))
+
+    bills = bills_in_range(
+        select(
+            bill_day.label("day"),
+            func.count(Bill.bill_id).label("bill_count"),
+            func.coalesce(func.sum(Bill.total_amount), 0).label("gross"),
+            func.coalesce(func.sum(Bill.discount), 0).label("discount"),
+            func.coalesce(func.sum(Bill.final_amount), 0).label("net"),
+        ),
+    ).group_by(bill_day).subquery()
+    items = bills_in_range(
+        select(bill_day.label("day"), func.sum(BillItem.quantity).label("items_sold"))
+        .join(Bill, Bill.bill_id == BillItem.bill_id),
+        with_items=True,
+    ).group_by(bill_day).subquery()
+    db.execute(DailySales.__table__.insert().from_select(
+        ["day", "bill_count", "gross", "discount", "net", "items_sold"],
+        select(bills.c.day, bills.c.bill_count, bills.c.gross, bills.c.discount, bills.c.net,
+               func.coalesce(items.c.items_sold, 0))
+        .select_from(bills.outerjoin(items, bills.c.day == items.c.day)),
+    ))
+
+    db.execute(ProductDailySales.__table__.insert().from_select(
+        ["day", "product_id", "quantity", "revenue"],
+        bills_in_range(
+            select(bill_day, BillItem.product_id, func.sum(BillItem.quantity), func.sum(BillItem.subtotal))
+            .join(Bill, Bill.bill_id == BillItem.bill_id),
+            with_items=True,
+        ).group_by(bill_day, BillItem.product_id),
+    ))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the daily sales rollups from raw bills")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--start", type=date.fromisoformat, default=None)
+    parser.add_argument("--end", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        rebuild(db, args.start, args.end)
+    finally:
+        db.close()
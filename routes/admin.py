@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends
+
+from database import replica_monitor, pool_status, slow_queries, SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN, DB_MAX_CONNECTIONS, PRIMARY_ENGINES, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_REPLICA_POOL_SIZE, DB_REPLICA_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, WEB_CONCURRENCY
+from security import get_current_user, ensure_admin  # ✅ auth helpers live in security.py
+from export_jobs import export_jobs
+
+router = APIRouter()
+
+@router.get("/admin/db/pool")
+def db_pool_stats(user = Depends(get_current_user)):
+    ensure_admin(user)
+    return {
+        "config": {
+            "web_concurrency": WEB_CONCURRENCY,
+            "max_connections": int(DB_MAX_CONNECTIONS) if DB_MAX_CONNECTIONS else None,
+            "primary_engines": PRIMARY_ENGINES,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "replica_pool_size": DB_REPLICA_POOL_SIZE,
+            "replica_max_overflow": DB_REPLICA_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        },
+        **pool_status(),
+    }
+
+@router.get("/admin/db/slow_queries")
+def db_slow_queries(user = Depends(get_current_user)):
+    ensure_admin(user)
+    return {
+        "threshold_ms": SLOW_QUERY_MS,
+        "explain": SLOW_QUERY_EXPLAIN,
+        "entries": list(reversed(slow_queries)),   # newest first
+    }
+
+@router.get("/admin/export_jobs")
+def export_job_stats(user = Depends(get_current_user)):
+    ensure_admin(user)
+    return {"kinds": export_jobs.kinds(), **export_jobs.stats()}
+
+@router.get("/admin/db/replica")
+def db_replica(user = Depends(get_current_user)):
+    ensure_admin(user)
+    return replica_monitor.status()
@@ -1,66 +1,92 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from sqlalchemy import DateTime, func
+from datetime import date, datetime, timedelta
 from typing import Optional
 
-from models import Bill, BillItem, Product, Client
+from models import DailySales, ProductDailySales, Product
 from schemas import SalesSummaryResponse
-from database import get_db   # ✅ DB session comes from database.py
+from database import SessionLocal, read_db_for, on_replica, run_db   # ✅ DB session comes from database.py
 from security import get_current_user, ensure_admin  # ✅ auth helpers in security.py
+from rollups import summary_cache, rebuild
+from export_jobs import export_jobs
 
 router = APIRouter()
 
+def _compute_summary(db: Session, start_day, end_day) -> dict:
+    # Answered from the daily rollups, so cost scales with days in range rather than bills.
+    # One grouped pass yields the weekly series; range totals are the sum of the weeks.
+    week = func.date_trunc('week', DailySales.day, type_=DateTime)
+    weeks = db.query(
+        week.label('week'),
+        func.sum(DailySales.bill_count).label('bill_count'),
+        func.sum(DailySales.gross).label('gross'),
+        func.sum(DailySales.discount).label('discount'),
+        func.sum(DailySales.net).label('net'),
+        func.sum(DailySales.items_sold).label('items_sold'),
+    ).filter(DailySales.day >= start_day, DailySales.day <= end_day)\
+     .group_by(week)\
+     .order_by(week).all()
+
+    top_products = db.query(
+        Product.name,
+        func.coalesce(func.sum(ProductDailySales.quantity), 0).label('total_sold')
+    ).join(ProductDailySales, Product.product_id == ProductDailySales.product_id)\
+     .filter(ProductDailySales.day >= start_day, ProductDailySales.day <= end_day)\
+     .group_by(Product.name)\
+     .order_by(func.sum(ProductDailySales.quantity).desc())\
+     .limit(5).all()
+
+    return {
+        "total_bills": int(sum(w.bill_count for w in weeks)),
+        "total_revenue": float(sum(w.gross for w in weeks)),
+        "total_discount": float(sum(w.discount for w in weeks)),
+        "final_revenue": float(sum(w.net for w in weeks)),
+        "items_sold": int(sum(w.items_sold for w in weeks)),
+        "weekly_sales": [{"week": str(w.week.date()), "total": float(w.net)} for w in weeks],
+        "weekly_discounts": [{"week": str(w.week.date()), "discount": float(w.discount)} for w in weeks],
+        "top_products": [{"name": p.name, "total_sold": int(p.total_sold)} for p in top_products],
+    }
+
 @router.get("/analytics/summary", response_model=SalesSummaryResponse)
-def analytics_summary(start: Optional[str] = None, end: Optional[str] = None, db: Session = Depends(get_db), user = Depends(get_current_user)):
+async def analytics_summary(start: Optional[str] = None, end: Optional[str] = None, db = Depends(read_db_for("analytics")), user = Depends(get_current_user)):
     ensure_admin(user)
     end_dt = datetime.fromisoformat(end) if end else datetime.utcnow()
     start_dt = datetime.fromisoformat(start) if start else (end_dt - timedelta(days=30))
 
-    totals = db.query(
-        func.count(Bill.bill_id),
-        func.coalesce(func.sum(Bill.total_amount), 0),
-        func.coalesce(func.sum(Bill.discount), 0),
-        func.coalesce(func.sum(Bill.final_amount), 0),
-    ).filter(Bill.date >= start_dt, Bill.date <= end_dt).one()
+    key = (start_dt.date(), end_dt.date())
+    summary = summary_cache.get(key)
+    if summary is None:
+        summary = await run_db(db, _compute_summary, *key)
+        # The cache is invalidated on primary commits; a lagging replica result stored after
+        # that invalidation would be served as fresh until the TTL, so only primary reads are cached
+        if not on_replica(db):
+            summary_cache.set(key, summary)
 
-    items = db.query(func.coalesce(func.sum(BillItem.quantity), 0))\
-        .join(Bill, Bill.bill_id == BillItem.bill_id)\
-        .filter(Bill.date >= start_dt, Bill.date <= end_dt).scalar()
+    return {"start_date": start_dt.isoformat(), "end_date": end_dt.isoformat(), **summary}
 
-    weekly_sales = db.query(
-        func.date_trunc('week', Bill.date).label('week'),
-        func.coalesce(func.sum(Bill.final_amount), 0).label('total')
-    ).filter(Bill.date >= start_dt, Bill.date <= end_dt)\
-     .group_by(func.date_trunc('week', Bill.date))\
-     .order_by('week').all()
+@router.get("/analytics/cache_stats")
+def analytics_cache_stats(user = Depends(get_current_user)):
+    ensure_admin(user)
+    return summary_cache.stats()
 
-    weekly_discounts = db.query(
-        func.date_trunc('week', Bill.date).label('week'),
-        func.coalesce(func.sum(Bill.discount), 0).label('discount')
-    ).filter(Bill.date >= start_dt, Bill.date <= end_dt)\
-     .group_by(func.date_trunc('week', Bill.date))\
-     .order_by('week').all()
+# -----------------------------
+# Rollup rebuilds run as background jobs (POST /export/jobs, kind=rollups_rebuild)
+# -----------------------------
+def _prepare_rebuild(params: dict) -> dict:
+    try:
+        start = date.fromisoformat(params["start"]).isoformat() if params.get("start") else None
+        end = date.fromisoformat(params["end"]).isoformat() if params.get("end") else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="start/end must be ISO dates")
+    return {"start": start, "end": end}
 
-    top_products = db.query(
-        Product.name,
-        func.coalesce(func.sum(BillItem.quantity), 0).label('total_sold')
-    ).join(BillItem, Product.product_id == BillItem.product_id)\
-     .join(Bill, Bill.bill_id == BillItem.bill_id)\
-     .filter(Bill.date >= start_dt, Bill.date <= end_dt)\
-     .group_by(Product.name)\
-     .order_by(func.sum(BillItem.quantity).desc())\
-     .limit(5).all()
+def _run_rebuild(params: dict):
+    db = SessionLocal()
+    try:
+        rebuild(db, date.fromisoformat(params["start"]) if params["start"] else None, date.fromisoformat(params["end"]) if params["end"] else None)
+    finally:
+        db.close()
+    yield from ()
 
-    return {
-        "start_date": start_dt.isoformat(),
-        "end_date": end_dt.isoformat(),
-        "total_bills": totals[0],
-        "total_revenue": float(totals[1]),
-        "total_discount": float(totals[2]),
-        "final_revenue": float(totals[3]),
-        "items_sold": int(items or 0),
-        "weekly_sales": [{"week": str(w.week.date()), "total": float(w.total)} for w in weekly_sales],
-        "weekly_discounts": [{"week": str(w.week.date()), "discount": float(w.discount)} for w in weekly_discounts],
-        "top_products": [{"name": p.name, "total_sold": int(p.total_sold)} for p in top_products],
-    }
\ No newline at end of file
+export_jobs.register("rollups_rebuild", _prepare_rebuild, lambda p: (None, None, _run_rebuild(p)))
@@ -1,31 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from models import User
 from schemas import LoginInput, RegisterInput, TokenResponse
 from database import get_db
-from security import get_password_hash, verify_password, create_access_token, get_current_user, ensure_admin
+from security import get_password_hash_async, verify_password_async, hash_pool, create_access_token, get_current_user, ensure_admin, invalidate_user_cache, user_cache, CurrentUser
 
 router = APIRouter()
 
+def _find_user(db: Session, username: str):
+    user = db.query(User).filter(User.username == username).first()
+    # Hand the connection back to the pool before waiting on bcrypt; a login storm
+    # would otherwise pin every pooled connection and stall unrelated endpoints
+    db.close()
+    return user
+
 @router.post("/auth/login", response_model=TokenResponse)
-def login(input: LoginInput, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == input.username).first()
-    if not user or not verify_password(input.password, user.hashed_password):
+async def login(input: LoginInput, db: Session = Depends(get_db)):
+    # async handler: DB work goes to the shared threadpool, bcrypt to the dedicated hash pool
+    user = await run_in_threadpool(_find_user, db, input.username)
+    if not user or not await verify_password_async(input.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token({"sub": user.username, "role": user.role})
     return TokenResponse(access_token=token, token_type="bearer", role=user.role)  # ✅ now matches schema
 
 @router.post("/auth/register")
-def register(input: RegisterInput, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def register(input: RegisterInput, db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     ensure_admin(current_user)
-    existing = db.query(User).filter(User.username == input.username).first()
+    existing = await run_in_threadpool(_find_user, db, input.username)
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
-    hashed_pw = get_password_hash(input.password)
+    hashed_pw = await get_password_hash_async(input.password)
     role = input.role if input.role in ("admin", "staff") else "staff"
     user = User(username=input.username, hashed_password=hashed_pw, role=role)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return {"message": "User registered successfully", "username": user.username, "role": user.role}
\ No newline at end of file
+
+    def save():
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    await run_in_threadpool(save)
+    invalidate_user_cache(user.username)
+    return {"message": "User registered successfully", "username": user.username, "role": user.role}
+
+@router.get("/auth/cache_stats")
+def auth_cache_stats(current_user: CurrentUser = Depends(get_current_user)):
+    ensure_admin(current_user)
+    stats = user_cache.stats()
+    stats["db_lookups_avoided"] = stats["hits"]
+    return stats
+
+@router.get("/auth/hash_stats")
+def auth_hash_stats(current_user: CurrentUser = Depends(get_current_user)):
+    ensure_admin(current_user)
+    return hash_pool.stats()
\ No newline at end of file
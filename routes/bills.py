@@ -1,102 +1,334 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, insert, tuple_
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 from models import Bill, BillItem, Client, Product
-from schemas import BillCreateInput, BillSummary, BillDetailResponse, BillDetailItem
-from database import get_db   # ✅ DB session comes from database.py
+from schemas import BillCreateInput, BillBulkResult, BillSummary, BillPage, BillDetailResponse, BillDetailItem
+from database import get_db, db_for, read_db_for, read_session, run_db   # ✅ DB session comes from database.py
 from security import get_current_user, ensure_staff_or_admin  # ✅ auth helpers live in security.py
+from client_totals import add_spent
+from changes import record_changes
+from rollups import record_sales, invalidate_summaries
+from bill_cache import bill_cache, fetch_bill, etag_header, is_not_modified
+import catalog
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
 
 router = APIRouter()
 
+BULK_CHUNK_SIZE = int(os.getenv("BILLS_BULK_CHUNK_SIZE", "200"))
+STREAM_BATCH_SIZE = 1000
+
+def _wanted_quantities(input: BillCreateInput) -> Dict[int, int]:
+    # Same product may appear on several lines; stock is checked against the combined quantity
+    wanted: Dict[int, int] = {}
+    for item in input.items:
+        wanted[item.product_id] = wanted.get(item.product_id, 0) + item.quantity
+    return wanted
+
+def _product_lines(items) -> Dict[int, Tuple[int, float]]:
+    lines: Dict[int, Tuple[int, float]] = {}
+    for item in items:
+        qty, revenue = lines.get(item.product_id, (0, 0.0))
+        lines[item.product_id] = (qty + item.quantity, revenue + item.price * item.quantity)
+    return lines
+
+def _lock_products(db: Session, product_ids) -> Dict[int, Product]:
+    # Lock every referenced product in one query, always in product_id order so that
+    # concurrent checkouts touching the same SKUs queue up instead of deadlocking
+    products = db.query(Product)\
+        .filter(Product.product_id.in_(list(product_ids)))\
+        .order_by(Product.product_id.asc())\
+        .with_for_update()\
+        .all()
+    return {p.product_id: p for p in products}
+
+def _decrement_stock(db: Session, wanted: Dict[int, int]) -> bool:
+    # One conditional UPDATE for all lines; the stock guard keeps it safe even without the row locks
+    qty_case = case(wanted, value=Product.product_id)
+    updated = db.query(Product)\
+        .filter(Product.product_id.in_(list(wanted)), Product.stock >= qty_case)\
+        .update({Product.stock: Product.stock - qty_case}, synchronize_session=False)
+    return updated == len(wanted)
+
 @router.post("/bills/create")
 def create_bill(input: BillCreateInput, db: Session = Depends(get_db), user = Depends(get_current_user)):
     ensure_staff_or_admin(user)
     if not input.items:
         raise HTTPException(status_code=400, detail="Bill must contain at least one item")
 
-    client = db.query(Client).filter(Client.name == input.client_name).first()
-    if not client:
-        client = Client(name=input.client_name, phone=input.phone or None)
-        db.add(client)
-        db.commit()
-        db.refresh(client)
+    # Prices and activity come from the in-memory catalog; stock is still checked under the row locks
+    error = catalog.check_items(db, input.items)
+    if error:
+        raise HTTPException(status_code=error[0], detail=error[1])
 
-    total = 0.0
-    prepared_items: List[BillItem] = []
-    for item in input.items:
-        product = db.query(Product).filter(Product.product_id == item.product_id).first()
+    wanted = _wanted_quantities(input)
+    by_id = _lock_products(db, wanted)
+    for product_id, qty in wanted.items():
+        product = by_id.get(product_id)
         if not product:
-            raise HTTPException(status_code=404, detail=f"Product ID {item.product_id} not found")
-        if product.stock < item.quantity:
+            raise HTTPException(status_code=404, detail=f"Product ID {product_id} not found")
+        if product.stock < qty:
             raise HTTPException(status_code=400, detail=f"Not enough stock for {product.name}")
 
+    # Items carry the bill's date so bill_items can be partitioned alongside bills
+    now = datetime.utcnow()
+    total = 0.0
+    prepared_items: List[BillItem] = []
+    for item in input.items:
         subtotal = item.price * item.quantity
         total += subtotal
-        product.stock -= item.quantity
-
-        prepared_items.append(BillItem(product_id=item.product_id, quantity=item.quantity, price=item.price, subtotal=subtotal))
+        prepared_items.append(BillItem(product_id=item.product_id, bill_date=now, quantity=item.quantity, price=item.price, subtotal=subtotal))
 
     final = total - input.discount
     if final < 0:
         raise HTTPException(status_code=400, detail="Final amount cannot be negative")
 
-    bill = Bill(client_id=client.client_id, total_amount=total, discount=input.discount, final_amount=final)
-    db.add(bill)
-    db.commit()
-    db.refresh(bill)
+    if not _decrement_stock(db, wanted):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Stock changed during checkout, please retry")
 
-    for bi in prepared_items:
-        bi.bill_id = bill.bill_id
-        db.add(bi)
+    client_id = db.query(Client.client_id).filter(Client.name == input.client_name).order_by(Client.client_id.asc()).limit(1).scalar()
+    if client_id is None:
+        client = Client(name=input.client_name, phone=input.phone or None, total_spent=final)
+        bill = Bill(client=client, date=now, total_amount=total, discount=input.discount, final_amount=final, items=prepared_items)
+    else:
+        bill = Bill(client_id=client_id, date=now, total_amount=total, discount=input.discount, final_amount=final, items=prepared_items)
+    db.add(bill)
 
-    client.total_spent = (client.total_spent or 0) + final
+    # Client, bill and all items go out in a single flush, then a single commit
+    db.flush()
+    bill_id = bill.bill_id
+    bill_day = now.date()
+    record_sales(db, bill_day, 1, total, input.discount, final, _product_lines(input.items))
+    # Atomic increment and change-feed entries go last so the hot client row and the
+    # change sequence row stay locked only until the commit
+    if client_id is not None:
+        add_spent(db, {client_id: final})
+    record_changes(db, [
+        ("bill", bill_id, "create"),
+        ("client", bill.client_id, "create" if client_id is None else "update"),
+        *(("product", pid, "update") for pid in sorted(wanted)),
+    ])
     db.commit()
+    invalidate_summaries(bill_day)
+    catalog.bump_stock_version()
 
-    return {"message": "Bill created", "bill_id": bill.bill_id, "final_amount": final}
+    return {"message": "Bill created", "bill_id": bill_id, "final_amount": final}
 
-@router.get("/bills/list", response_model=List[BillSummary])
-def list_bills(db: Session = Depends(get_db), user = Depends(get_current_user)):
+@router.post("/bills/bulk_create", response_model=List[BillBulkResult])
+def bulk_create_bills(
+    inputs: List[BillCreateInput],
+    chunk_size: int = Query(BULK_CHUNK_SIZE, gt=0, le=5000),
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user),
+):
     ensure_staff_or_admin(user)
-    rows = db.query(Bill, Client).join(Client, Bill.client_id == Client.client_id).order_by(Bill.date.desc()).all()
-    return [
-        BillSummary(
-            bill_id=b.bill_id,
-            client_name=c.name,
-            date=b.date.isoformat(),
-            total_amount=b.total_amount,
-            discount=b.discount,
-            final_amount=b.final_amount,
+    results: Dict[int, BillBulkResult] = {}
+    for offset in range(0, len(inputs), chunk_size):
+        chunk = list(enumerate(inputs[offset:offset + chunk_size], start=offset))
+        now = datetime.utcnow()
+        try:
+            _create_bill_chunk(db, chunk, now, results)
+            db.commit()
+            invalidate_summaries(now.date())
+            catalog.bump_stock_version()
+        except HTTPException as e:
+            db.rollback()
+            _fail_attempted(results, chunk, e.detail)
+        except SQLAlchemyError as e:
+            db.rollback()
+            _fail_attempted(results, chunk, f"Database error: {e.__class__.__name__}")
+    return [results[i] for i in range(len(inputs))]
+
+def _fail_attempted(results: Dict[int, BillBulkResult], chunk, error: str):
+    # Bills already rejected during validation keep their own error; everything else in the
+    # chunk was rolled back with it
+    for index, _ in chunk:
+        if index not in results or results[index].status != "failed":
+            results[index] = BillBulkResult(index=index, status="failed", error=error)
+
+def _create_bill_chunk(db: Session, chunk, now: datetime, results: Dict[int, BillBulkResult]):
+    # Validates and inserts one chunk, recording a result per bill into results (keyed by index)
+    accepted = []   # (index, input, total, final)
+
+    # Validate every bill against one locked snapshot of the chunk's products;
+    # bills are applied in submission order so earlier ones win on scarce stock
+    by_id = _lock_products(db, {item.product_id for _, b in chunk for item in b.items})
+    remaining = {pid: p.stock for pid, p in by_id.items()}
+    chunk_wanted: Dict[int, int] = {}
+    for index, b in chunk:
+        if not b.items:
+            results[index] = BillBulkResult(index=index, status="failed", error="Bill must contain at least one item")
+            continue
+        # Replayed bills keep the price charged at the till, so only existence/activity is
+        # checked here (against the locked rows, not the catalog snapshot)
+        wanted = _wanted_quantities(b)
+        missing = next((pid for pid in wanted if pid not in by_id or not by_id[pid].is_active), None)
+        if missing is not None:
+            results[index] = BillBulkResult(index=index, status="failed", error=f"Product ID {missing} not found")
+            continue
+        short = next((pid for pid, qty in wanted.items() if remaining[pid] < qty), None)
+        if short is not None:
+            results[index] = BillBulkResult(index=index, status="failed", error=f"Not enough stock for {by_id[short].name}")
+            continue
+        total = sum(item.price * item.quantity for item in b.items)
+        final = total - b.discount
+        if final < 0:
+            results[index] = BillBulkResult(index=index, status="failed", error="Final amount cannot be negative")
+            continue
+        for pid, qty in wanted.items():
+            remaining[pid] -= qty
+            chunk_wanted[pid] = chunk_wanted.get(pid, 0) + qty
+        accepted.append((index, b, total, final))
+
+    if accepted:
+        if not _decrement_stock(db, chunk_wanted):
+            raise HTTPException(status_code=409, detail="Stock changed during bulk import, please retry")
+
+        # Resolve existing clients in one query and create the missing ones in one INSERT
+        names = list(dict.fromkeys(b.client_name for _, b, _, _ in accepted))
+        client_ids: Dict[str, int] = {}
+        for client_id, name in db.query(Client.client_id, Client.name).filter(Client.name.in_(names)).order_by(Client.client_id.asc()):
+            client_ids.setdefault(name, client_id)
+        phones = {}
+        for _, b, _, _ in accepted:
+            phones.setdefault(b.client_name, b.phone or None)
+        new_clients = [{"name": n, "phone": phones[n], "total_spent": 0} for n in names if n not in client_ids]
+        existing_client_ids = set(client_ids.values())
+        if new_clients:
+            created = db.execute(insert(Client).returning(Client.client_id, Client.name, sort_by_parameter_order=True), new_clients)
+            for client_id, name in created:
+                client_ids[name] = client_id
+
+        bill_ids = db.execute(
+            insert(Bill).returning(Bill.bill_id, sort_by_parameter_order=True),
+            [{"client_id": client_ids[b.client_name], "date": now, "total_amount": total, "discount": b.discount, "final_amount": final} for _, b, total, final in accepted],
+        ).scalars().all()
+
+        item_rows = []
+        spent: Dict[int, float] = {}
+        for bill_id, (index, b, total, final) in zip(bill_ids, accepted):
+            for item in b.items:
+                item_rows.append({"bill_id": bill_id, "bill_date": now, "product_id": item.product_id, "quantity": item.quantity, "price": item.price, "subtotal": item.price * item.quantity})
+            client_id = client_ids[b.client_name]
+            spent[client_id] = spent.get(client_id, 0) + final
+            results[index] = BillBulkResult(index=index, status="created", bill_id=bill_id, final_amount=final)
+        db.execute(insert(BillItem), item_rows)
+
+        record_sales(
+            db, now.date(), len(accepted),
+            sum(total for _, _, total, _ in accepted),
+            sum(b.discount for _, b, _, _ in accepted),
+            sum(final for _, _, _, final in accepted),
+            _product_lines(item for _, b, _, _ in accepted for item in b.items),
         )
-        for (b, c) in rows
-    ]
+        add_spent(db, spent)
+        record_changes(db, [
+            *(("bill", bill_id, "create") for bill_id in bill_ids),
+            *(("client", cid, "update" if cid in existing_client_ids else "create") for cid in sorted(spent)),
+            *(("product", pid, "update") for pid in sorted(chunk_wanted)),
+        ])
 
-@router.get("/bills/{bill_id}", response_model=BillDetailResponse)
-def get_bill(bill_id: int, db: Session = Depends(get_db), user = Depends(get_current_user)):
-    ensure_staff_or_admin(user)
-    bill = db.query(Bill).filter(Bill.bill_id == bill_id).first()
-    if not bill:
-        raise HTTPException(status_code=404, detail="Bill not found")
+def _parse_list_filters(start: Optional[str], end: Optional[str], after: Optional[str]):
+    try:
+        start_dt = datetime.fromisoformat(start) if start else None
+        end_dt = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be ISO dates")
+    after_key = None
+    if after:
+        after_date, after_id = decode_cursor(after, 2)
+        try:
+            after_key = (datetime.fromisoformat(after_date), int(after_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return start_dt, end_dt, after_key
+
+def _bill_list_query(db: Session, start_dt: Optional[datetime], end_dt: Optional[datetime], client_id: Optional[int], after_key):
+    q = db.query(Bill.bill_id, Client.name, Bill.date, Bill.total_amount, Bill.discount, Bill.final_amount)\
+        .join(Client, Bill.client_id == Client.client_id)
+    if start_dt:
+        q = q.filter(Bill.date >= start_dt)
+    if end_dt:
+        q = q.filter(Bill.date <= end_dt)
+    if client_id is not None:
+        q = q.filter(Bill.client_id == client_id)
+    if after_key:
+        q = q.filter(tuple_(Bill.date, Bill.bill_id) < tuple_(*after_key))
+    return q.order_by(Bill.date.desc(), Bill.bill_id.desc())
+
+def _bill_summary_row(row) -> dict:
+    bill_id, client_name, date, total_amount, discount, final_amount = row
+    return {
+        "bill_id": bill_id,
+        "client_name": client_name,
+        "date": date.isoformat(),
+        "total_amount": total_amount,
+        "discount": discount,
+        "final_amount": final_amount,
+    }
+
+def _stream_bill_list(filters, client_id, authorization):
+    # Own session: the request-scoped one is closed before the body is streamed
+    start_dt, end_dt, after_key = filters
+    db = read_session(authorization)
+    try:
+        for row in _bill_list_query(db, start_dt, end_dt, client_id, after_key).yield_per(STREAM_BATCH_SIZE):
+            yield json.dumps(_bill_summary_row(row)) + "\n"
+    finally:
+        db.close()
 
-    client = db.query(Client).filter(Client.client_id == bill.client_id).first()
-    items = db.query(BillItem, Product).join(Product, BillItem.product_id == Product.product_id).filter(BillItem.bill_id == bill_id).all()
+def _bill_page(db: Session, filters, client_id: Optional[int], limit: int) -> BillPage:
+    start_dt, end_dt, after_key = filters
+    rows = _bill_list_query(db, start_dt, end_dt, client_id, after_key).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.date.isoformat(), last.bill_id)
+    return BillPage(items=[BillSummary(**_bill_summary_row(r)) for r in rows], next_cursor=next_cursor)
 
+@router.get("/bills/list", response_model=BillPage)
+async def list_bills(
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    client_id: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    authorization: Optional[str] = Header(None),
+    db = Depends(read_db_for("bills")),
+    user = Depends(get_current_user),
+):
+    ensure_staff_or_admin(user)
+    filters = _parse_list_filters(start, end, after)
+    if format == "ndjson":
+        # Streams every matching row (limit is ignored) through a server-side cursor
+        return StreamingResponse(_stream_bill_list(filters, client_id, authorization), media_type="application/x-ndjson")
+    return await run_db(db, _bill_page, filters, client_id, limit)
+
+@router.get("/bills/{bill_id}", response_model=BillDetailResponse)
+async def get_bill(bill_id: int, response: Response, if_none_match: Optional[str] = Header(None), db = Depends(db_for("bills")), user = Depends(get_current_user)):
+    ensure_staff_or_admin(user)
+    # Cache hits skip the threadpool hop entirely; misses go straight to the query
+    bill = bill_cache.get(bill_id) or await run_db(db, fetch_bill, bill_id)
+    etag = etag_header(bill, "json")
+    if is_not_modified(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return BillDetailResponse(
-        bill_id=bill.bill_id,
-        client_id=bill.client_id,
-        client_name=client.name if client else "",
-        date=bill.date.isoformat(),
-        total_amount=bill.total_amount,
-        discount=bill.discount,
-        final_amount=bill.final_amount,
-        items=[
-            BillDetailItem(
-                product_id=p.product_id,
-                name=p.name,
-                quantity=bi.quantity,
-                price=bi.price,
-                subtotal=bi.subtotal,
-            )
-            for (bi, p) in items
-        ],
-    )
\ No newline at end of file
+        bill_id=bill["bill_id"],
+        client_id=bill["client_id"],
+        client_name=bill["client_name"],
+        date=bill["date"],
+        total_amount=bill["total_amount"],
+        discount=bill["discount"],
+        final_amount=bill["final_amount"],
+        items=[BillDetailItem(**item) for item in bill["items"]],
+    )
@@ -0,0 +1,34 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from schemas import ChangePage, ChangeEntry
+from database import read_db_for, run_db   # ✅ DB session comes from database.py
+from security import get_current_user, ensure_staff_or_admin  # ✅ auth helpers live in security.py
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from changes import read_changes, oldest_seq
+
+router = APIRouter()
+
+def _change_page(db: Session, since: Optional[str], limit: int) -> ChangePage:
+    after = 0
+    if since:
+        (after,) = decode_cursor(since, 1)
+        if not isinstance(after, int) or after < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        oldest = oldest_seq(db)
+        if after and oldest is not None and after < oldest - 1:
+            raise HTTPException(status_code=410, detail="Cursor is older than the retained change log, reload in full")
+    entries, last_seq, has_more = read_changes(db, after, limit)
+    return ChangePage(changes=[ChangeEntry(**e) for e in entries], next_cursor=encode_cursor(last_seq), has_more=has_more)
+
+@router.get("/changes", response_model=ChangePage)
+async def list_changes(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    db = Depends(read_db_for("changes")),
+    user = Depends(get_current_user),
+):
+    # Without `since` the feed starts at the beginning of the retained log
+    ensure_staff_or_admin(user)
+    return await run_db(db, _change_page, since, limit)
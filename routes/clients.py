@@ -1,62 +1,217 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import re
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, case, func, literal, literal_column, or_, select, tuple_
 from sqlalchemy.orm import Session
 
 from models import Client, Bill
-from database import get_db   # ✅ DB session comes from database.py
+from schemas import ClientSummary, ClientPage, ClientHistory, ClientHistoryBill
+from database import read_db_for, run_db   # ✅ DB session comes from database.py
 from security import get_current_user, ensure_staff_or_admin  # ✅ auth helpers live in security.py
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
 
 router = APIRouter()
 
-@router.get("/clients/list")
-def list_clients(db: Session = Depends(get_db), user = Depends(get_current_user)):
-    ensure_staff_or_admin(user)
-    clients = db.query(Client).order_by(Client.name.asc()).all()
-    return [{"client_id": c.client_id, "name": c.name, "phone": c.phone, "total_spent": c.total_spent or 0} for c in clients]
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_FUZZY = os.getenv("CLIENT_SEARCH_FUZZY", "1") == "1"   # pg_trgm similarity matches on Postgres
+FUZZY_MIN_LENGTH = 3
 
-@router.get("/clients/by_name/{client_name}/history")
-def client_history_by_name(client_name: str, db: Session = Depends(get_db), user = Depends(get_current_user)):
-    ensure_staff_or_admin(user)
-    client = db.query(Client).filter(Client.name == client_name).first()
-    if not client:
+def _client_row(row) -> ClientSummary:
+    client_id, name, phone, total_spent = row
+    return ClientSummary(client_id=client_id, name=name, phone=phone, total_spent=total_spent or 0)
+
+def _client_page(db: Session, after: Optional[str], limit: int) -> ClientPage:
+    q = db.query(Client.client_id, Client.name, Client.phone, Client.total_spent)
+    if after:
+        after_name, after_id = decode_cursor(after, 2)
+        if not isinstance(after_name, str) or not isinstance(after_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        q = q.filter(tuple_(Client.name, Client.client_id) > tuple_(after_name, after_id))
+    rows = q.order_by(Client.name.asc(), Client.client_id.asc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].name, rows[-1].client_id)
+    return ClientPage(items=[_client_row(r) for r in rows], next_cursor=next_cursor)
+
+def _prefix(expr, value: str):
+    # Pattern is built here rather than with startswith() so Postgres sees a plain constant it can turn into an index range
+    escaped = value.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return expr.like(escaped + "%", escape="/")
+
+def _search_clients(db: Session, term: str, after: Optional[str], limit: int) -> ClientPage:
+    # Ranked results can't be keyset-paginated, so the cursor carries an offset;
+    # type-ahead rarely goes past the first couple of pages
+    offset = 0
+    if after:
+        (offset,) = decode_cursor(after, 1)
+        if not isinstance(offset, int) or offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    postgres = db.get_bind().dialect.name == "postgresql"
+    needle = term.strip().lower()
+    digits = re.sub(r"\D", "", term)
+    fuzzy = SEARCH_FUZZY and postgres and len(needle) >= FUZZY_MIN_LENGTH
+
+    # Same expressions as the indexes in alembic revision 0006; constants are inlined so the planner can match them
+    name_key = func.lower(Client.name)
+    if postgres:
+        phone_key = func.regexp_replace(Client.phone, literal_column("'\\D'"), literal_column("''"), literal_column("'g'"))
+    else:
+        phone_key = Client.phone
+        for sep in ("-", " ", "+", "(", ")"):
+            phone_key = func.replace(phone_key, sep, "")
+    name_prefix = _prefix(name_key, needle)
+    phone_prefix = _prefix(phone_key, digits) if digits else None
+
+    matches = [name_prefix]
+    if phone_prefix is not None:
+        matches.append(phone_prefix)
+    if fuzzy:
+        matches.append(name_key.op("%")(needle))
+
+    whens = [(name_key == needle, 0), (name_prefix, 1)]
+    if phone_prefix is not None:
+        whens.append((phone_prefix, 2))
+    rank = case(*whens, else_=3)
+    similarity = func.similarity(name_key, needle) if fuzzy else literal(0)
+
+    rows = db.query(Client.client_id, Client.name, Client.phone, Client.total_spent)\
+        .filter(or_(*matches))\
+        .order_by(rank, similarity.desc(), Client.name.asc(), Client.client_id.asc())\
+        .offset(offset)\
+        .limit(limit + 1)\
+        .all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(offset + limit)
+    return ClientPage(items=[_client_row(r) for r in rows], next_cursor=next_cursor)
+
+def _parse_history_filters(start: Optional[str], end: Optional[str], after: Optional[str]):
+    try:
+        start_dt = datetime.fromisoformat(start) if start else None
+        end_dt = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be ISO dates")
+    after_key = None
+    if after:
+        after_date, after_id = decode_cursor(after, 2)
+        try:
+            after_key = (datetime.fromisoformat(after_date), int(after_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return start_dt, end_dt, after_key
+
+def _client_history(db: Session, client_filter, filters, limit: int) -> ClientHistory:
+    start_dt, end_dt, after_key = filters
+
+    # Client row, its bills in the date range and the range-wide stats (window functions)
+    # come back together; the client is outer-joined so clients without bills still resolve
+    bill_on = [Bill.client_id == Client.client_id]
+    if start_dt:
+        bill_on.append(Bill.date >= start_dt)
+    if end_dt:
+        bill_on.append(Bill.date <= end_dt)
+    newest_first = (Bill.date.desc(), Bill.bill_id.desc())
+    history = select(
+        Client.client_id, Client.name, Client.phone, Client.total_spent,
+        Bill.bill_id, Bill.date, Bill.total_amount, Bill.discount, Bill.final_amount,
+        func.count(Bill.bill_id).over().label("bill_count"),
+        func.min(Bill.date).over().label("first_purchase"),
+        func.max(Bill.date).over().label("last_purchase"),
+        func.avg(Bill.final_amount).over().label("average_ticket"),
+        func.row_number().over(order_by=newest_first).label("rn"),
+    ).select_from(Client).outerjoin(Bill, and_(*bill_on)).where(client_filter).subquery()
+
+    # The newest row is always returned as well, so a page past the end still carries client and stats
+    page = select(history).order_by(history.c.date.desc(), history.c.bill_id.desc())
+    if after_key:
+        page = page.where(or_(history.c.rn == 1, tuple_(history.c.date, history.c.bill_id) < tuple_(*after_key)))
+    rows = db.execute(page.limit(limit + 2)).all()
+    if not rows:
         raise HTTPException(status_code=404, detail="Client not found")
-    bills = db.query(Bill).filter(Bill.client_id == client.client_id).order_by(Bill.date.desc()).all()
-    return {
-        "client_id": client.client_id,
-        "name": client.name,
-        "phone": client.phone,
-        "total_spent": client.total_spent or 0,
-        "bills": [
-            {
-                "bill_id": b.bill_id,
-                "date": b.date.isoformat(),
-                "total_amount": b.total_amount,
-                "discount": b.discount,
-                "final_amount": b.final_amount,
-            }
+
+    first = rows[0]
+    bills = [r for r in rows if r.bill_id is not None and (after_key is None or (r.date, r.bill_id) < after_key)]
+    next_cursor = None
+    if len(bills) > limit:
+        bills = bills[:limit]
+        next_cursor = encode_cursor(bills[-1].date.isoformat(), bills[-1].bill_id)
+    return ClientHistory(
+        client_id=first.client_id,
+        name=first.name,
+        phone=first.phone,
+        total_spent=first.total_spent or 0,
+        bill_count=first.bill_count,
+        first_purchase=first.first_purchase.isoformat() if first.first_purchase else None,
+        last_purchase=first.last_purchase.isoformat() if first.last_purchase else None,
+        average_ticket=first.average_ticket or 0,
+        bills=[
+            ClientHistoryBill(
+                bill_id=b.bill_id,
+                date=b.date.isoformat(),
+                total_amount=b.total_amount,
+                discount=b.discount,
+                final_amount=b.final_amount,
+            )
             for b in bills
         ],
-    }
+        next_cursor=next_cursor,
+    )
 
-@router.get("/clients/{client_id}/history")
-def client_history(client_id: int, db: Session = Depends(get_db), user = Depends(get_current_user)):
+@router.get("/clients/list", response_model=ClientPage)
+async def list_clients(
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db = Depends(read_db_for("clients")),
+    user = Depends(get_current_user),
+):
     ensure_staff_or_admin(user)
-    client = db.query(Client).filter(Client.client_id == client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    bills = db.query(Bill).filter(Bill.client_id == client_id).order_by(Bill.date.desc()).all()
-    return {
-        "client_id": client.client_id,
-        "name": client.name,
-        "phone": client.phone,
-        "total_spent": client.total_spent or 0,
-        "bills": [
-            {
-                "bill_id": b.bill_id,
-                "date": b.date.isoformat(),
-                "total_amount": b.total_amount,
-                "discount": b.discount,
-                "final_amount": b.final_amount,
-            }
-            for b in bills
-        ],
-    }
\ No newline at end of file
+    return await run_db(db, _client_page, after, limit)
+
+@router.get("/clients/search", response_model=ClientPage)
+async def search_clients(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(SEARCH_PAGE_SIZE, gt=0, le=SEARCH_MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db = Depends(read_db_for("clients")),
+    user = Depends(get_current_user),
+):
+    ensure_staff_or_admin(user)
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search term is empty")
+    return await run_db(db, _search_clients, q, after, limit)
+
+@router.get("/clients/{client_id}/history", response_model=ClientHistory)
+async def client_history(
+    client_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db = Depends(read_db_for("clients")),
+    user = Depends(get_current_user),
+):
+    ensure_staff_or_admin(user)
+    filters = _parse_history_filters(start, end, after)
+    return await run_db(db, _client_history, Client.client_id == client_id, filters, limit)
+
+@router.get("/clients/by_name/{client_name}/history", response_model=ClientHistory, deprecated=True)
+async def client_history_by_name(
+    client_name: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db = Depends(read_db_for("clients")),
+    user = Depends(get_current_user),
+):
+    # Kept for existing callers; resolve the client via /clients/search and use /clients/{client_id}/history
+    ensure_staff_or_admin(user)
+    filters = _parse_history_filters(start, end, after)
+    by_name = select(func.min(Client.client_id)).where(Client.name == client_name).scalar_subquery()
+    return await run_db(db, _client_history, Client.client_id == by_name, filters, limit)
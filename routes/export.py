@@ -1,37 +1,323 @@
-from fastapi import APIRouter, Depends
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import datetime
-from io import StringIO
+from io import RawIOBase, StringIO
 import csv
-from fastapi.responses import StreamingResponse
+import zlib
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:   # in requirements.txt; guarded so a slim install without it still serves everything but the columnar exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 from models import Bill, Client, BillItem, Product
-from database import get_db   # ✅ DB session comes from database.py
+from database import read_session   # ✅ DB session comes from database.py
 from security import get_current_user, ensure_admin  # ✅ auth helpers live in security.py
+from schemas import ExportJobInput
+from export_jobs import export_jobs, parse_range, iter_file
 
 router = APIRouter()
 
-@router.get("/export/monthly_csv")
-def export_monthly_csv(year: int, month: int, db: Session = Depends(get_db), user = Depends(get_current_user)):
-    ensure_admin(user)
-    start_dt = datetime(year, month, 1)
-    end_dt = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+STREAM_BATCH_SIZE = 1000
+CSV_CHUNK_BYTES = 64 * 1024
+
+def _monthly_csv_rows(db: Session, start_dt: datetime, end_dt: datetime):
+    yield ["bill_id", "date", "client_name", "total_amount", "discount", "final_amount"]
+    bills = db.query(Bill.bill_id, Bill.date, Client.name, Bill.total_amount, Bill.discount, Bill.final_amount)\
+        .join(Client, Bill.client_id == Client.client_id)\
+        .filter(Bill.date >= start_dt, Bill.date < end_dt)\
+        .order_by(Bill.date.asc(), Bill.bill_id.asc())\
+        .yield_per(STREAM_BATCH_SIZE)
+    for bill_id, date, client_name, total_amount, discount, final_amount in bills:
+        yield [bill_id, date.isoformat(), client_name, total_amount, discount, final_amount]
 
-    bills = db.query(Bill, Client).join(Client, Bill.client_id == Client.client_id).filter(Bill.date >= start_dt, Bill.date < end_dt).order_by(Bill.date.asc()).all()
+    yield []
+    yield ["bill_id", "product_id", "product_name", "quantity", "price", "subtotal"]
+    # All items for the month in one ordered join instead of one query per bill;
+    # the bill_date bound lets Postgres prune bill_items partitions too
+    items = db.query(BillItem.bill_id, Product.product_id, Product.name, BillItem.quantity, BillItem.price, BillItem.subtotal)\
+        .join(Bill, Bill.bill_id == BillItem.bill_id)\
+        .join(Product, BillItem.product_id == Product.product_id)\
+        .filter(Bill.date >= start_dt, Bill.date < end_dt, BillItem.bill_date >= start_dt, BillItem.bill_date < end_dt)\
+        .order_by(Bill.date.asc(), Bill.bill_id.asc(), BillItem.bill_item_id.asc())\
+        .yield_per(STREAM_BATCH_SIZE)
+    for row in items:
+        yield list(row)
 
+def _stream_monthly_csv(start_dt: datetime, end_dt: datetime, compress: bool):
+    # Own session: the request-scoped one is closed before the body is streamed
+    db = read_session()
+    gz = zlib.compressobj(wbits=31) if compress else None
     output = StringIO()
     writer = csv.writer(output)
-    writer.writerow(["bill_id", "date", "client_name", "total_amount", "discount", "final_amount"])
-    for b, c in bills:
-        writer.writerow([b.bill_id, b.date.isoformat(), c.name, b.total_amount, b.discount, b.final_amount])
-
-    writer.writerow([])
-    writer.writerow(["bill_id", "product_id", "product_name", "quantity", "price", "subtotal"])
-    for b, _ in bills:
-        items = db.query(BillItem, Product).join(Product, BillItem.product_id == Product.product_id).filter(BillItem.bill_id == b.bill_id).all()
-        for bi, p in items:
-            writer.writerow([b.bill_id, p.product_id, p.name, bi.quantity, bi.price, bi.subtotal])
-
-    output.seek(0)
+
+    def flush():
+        data = output.getvalue().encode()
+        output.seek(0)
+        output.truncate()
+        return gz.compress(data) if gz else data
+
+    try:
+        for row in _monthly_csv_rows(db, start_dt, end_dt):
+            writer.writerow(row)
+            if output.tell() >= CSV_CHUNK_BYTES:
+                chunk = flush()
+                if chunk:
+                    yield chunk
+        chunk = flush()
+        if gz:
+            chunk += gz.flush()
+        if chunk:
+            yield chunk
+    finally:
+        db.close()
+
+def _month_range(year: int, month: int):
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="month must be 1-12")
+    start_dt = datetime(year, month, 1)
+    end_dt = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start_dt, end_dt
+
+def _monthly_csv_export(year: int, month: int, gzip: bool):
+    start_dt, end_dt = _month_range(year, month)
     filename = f"sales_{year}_{month:02d}.csv"
-    return StreamingResponse(output, media_type="text/csv", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
\ No newline at end of file
+    if gzip:
+        return filename + ".gz", "application/gzip", _stream_monthly_csv(start_dt, end_dt, compress=True)
+    return filename, "text/csv", _stream_monthly_csv(start_dt, end_dt, compress=False)
+
+@router.get("/export/monthly_csv")
+def export_monthly_csv(year: int, month: int, gzip: bool = False, user = Depends(get_current_user)):
+    # Runs inside the request; prefer POST /export/jobs with kind=monthly_csv for large months
+    ensure_admin(user)
+    filename, media_type, body = _monthly_csv_export(year, month, gzip)
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# -----------------------------
+# Columnar exports (Parquet / Arrow IPC)
+# Rows come off a server-side cursor in batches of plain Core rows and are transposed
+# column-wise into typed Arrow arrays; no ORM objects or per-row dicts are built.
+# -----------------------------
+COLUMNAR_FETCH_SIZE = 10000
+PARQUET_ROW_GROUP_ROWS = 100_000
+
+def _columnar_query(table: str, start_dt: datetime, end_dt: datetime):
+    in_range = [Bill.date >= start_dt, Bill.date < end_dt]
+    items_in_range = in_range + [BillItem.bill_date >= start_dt, BillItem.bill_date < end_dt]
+    if table == "bills":
+        return select(Bill.bill_id, Bill.date, Bill.client_id, Client.name.label("client_name"),
+                      Bill.total_amount, Bill.discount, Bill.final_amount)\
+            .join(Client, Bill.client_id == Client.client_id)\
+            .where(*in_range)\
+            .order_by(Bill.date.asc(), Bill.bill_id.asc())
+    if table == "items":
+        return select(BillItem.bill_item_id, BillItem.bill_id, BillItem.bill_date, BillItem.product_id,
+                      Product.name.label("product_name"), BillItem.quantity, BillItem.price, BillItem.subtotal)\
+            .join(Bill, Bill.bill_id == BillItem.bill_id)\
+            .join(Product, BillItem.product_id == Product.product_id)\
+            .where(*items_in_range)\
+            .order_by(Bill.date.asc(), Bill.bill_id.asc(), BillItem.bill_item_id.asc())
+    return select(Bill.bill_id, Bill.date, Bill.client_id, Client.name.label("client_name"),
+                  Bill.total_amount, Bill.discount, Bill.final_amount,
+                  BillItem.bill_item_id, BillItem.product_id, Product.name.label("product_name"),
+                  BillItem.quantity, BillItem.price, BillItem.subtotal)\
+        .join(Client, Bill.client_id == Client.client_id)\
+        .join(BillItem, BillItem.bill_id == Bill.bill_id)\
+        .join(Product, BillItem.product_id == Product.product_id)\
+        .where(*items_in_range)\
+        .order_by(Bill.date.asc(), Bill.bill_id.asc(), BillItem.bill_item_id.asc())
+
+def _arrow_schema(table: str):
+    ts = pa.timestamp("us")
+    bills = [("bill_id", pa.int64()), ("date", ts), ("client_id", pa.int64()), ("client_name", pa.string()),
+             ("total_amount", pa.float64()), ("discount", pa.float64()), ("final_amount", pa.float64())]
+    items = [("bill_item_id", pa.int64()), ("bill_id", pa.int64()), ("bill_date", ts), ("product_id", pa.int64()),
+             ("product_name", pa.string()), ("quantity", pa.int64()), ("price", pa.float64()), ("subtotal", pa.float64())]
+    flat = bills + [("bill_item_id", pa.int64()), ("product_id", pa.int64()), ("product_name", pa.string()),
+                    ("quantity", pa.int64()), ("price", pa.float64()), ("subtotal", pa.float64())]
+    return pa.schema({"bills": bills, "items": items, "flat": flat}[table])
+
+def _record_batches(table: str, start_dt: datetime, end_dt: datetime):
+    schema = _arrow_schema(table)
+    db = read_session()
+    try:
+        result = db.execute(_columnar_query(table, start_dt, end_dt), execution_options={"yield_per": COLUMNAR_FETCH_SIZE})
+        for rows in result.partitions():
+            # The DBAPI drivers in use hand back rows, so each fetch batch is transposed once here;
+            # a row-free path would need a columnar driver (ADBC / COPY BINARY) instead of psycopg2
+            columns = zip(*rows)
+            yield pa.record_batch([pa.array(col, field.type) for col, field in zip(columns, schema)], schema=schema)
+    finally:
+        db.close()
+
+class _ChunkSink(RawIOBase):
+    # Write-only, forward-only file for pyarrow: output is handed to the client as it is produced
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _stream_parquet(table: str, start_dt: datetime, end_dt: datetime):
+    schema = _arrow_schema(table)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    pending, pending_rows = [], 0
+
+    def write_row_group():
+        writer.write_table(pa.Table.from_batches(pending, schema=schema))
+        pending.clear()
+
+    for batch in _record_batches(table, start_dt, end_dt):
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= PARQUET_ROW_GROUP_ROWS:
+            write_row_group()
+            pending_rows = 0
+            yield sink.drain()
+    if pending:
+        write_row_group()
+    writer.close()
+    yield sink.drain()
+
+def _stream_arrow(table: str, start_dt: datetime, end_dt: datetime):
+    schema = _arrow_schema(table)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for batch in _record_batches(table, start_dt, end_dt):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def _columnar_range(start: str, end: str):
+    if pa is None:
+        raise HTTPException(status_code=501, detail="Columnar export needs pyarrow installed on the server")
+    try:
+        start_dt, end_dt = datetime.fromisoformat(start), datetime.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be ISO dates")
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    return start_dt, end_dt
+
+@router.get("/export/parquet")
+def export_parquet(start: str, end: str, table: str = Query("flat", pattern="^(flat|bills|items)$"), user = Depends(get_current_user)):
+    # [start, end) range; "flat" is one row per bill item with the bill columns repeated
+    ensure_admin(user)
+    start_dt, end_dt = _columnar_range(start, end)
+    filename = f"sales_{table}_{start_dt:%Y%m%d}_{end_dt:%Y%m%d}.parquet"
+    return StreamingResponse(
+        _stream_parquet(table, start_dt, end_dt),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/export/arrow")
+def export_arrow(start: str, end: str, table: str = Query("flat", pattern="^(flat|bills|items)$"), user = Depends(get_current_user)):
+    ensure_admin(user)
+    start_dt, end_dt = _columnar_range(start, end)
+    filename = f"sales_{table}_{start_dt:%Y%m%d}_{end_dt:%Y%m%d}.arrows"
+    return StreamingResponse(
+        _stream_arrow(table, start_dt, end_dt),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# -----------------------------
+# Export jobs: run in the background, download later (with Range support)
+# -----------------------------
+def _prepare_monthly_csv(params: dict) -> dict:
+    try:
+        year, month = int(params["year"]), int(params["month"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="monthly_csv needs integer year and month")
+    _month_range(year, month)
+    return {"year": year, "month": month, "gzip": bool(params.get("gzip", False))}
+
+def _prepare_columnar(params: dict) -> dict:
+    start_dt, end_dt = _columnar_range(str(params.get("start", "")), str(params.get("end", "")))
+    table = params.get("table", "flat")
+    if table not in ("flat", "bills", "items"):
+        raise HTTPException(status_code=400, detail="table must be flat, bills or items")
+    return {"start": start_dt.isoformat(), "end": end_dt.isoformat(), "table": table}
+
+def _columnar_export(params: dict, ext: str, media_type: str, stream):
+    start_dt, end_dt = datetime.fromisoformat(params["start"]), datetime.fromisoformat(params["end"])
+    filename = f"sales_{params['table']}_{start_dt:%Y%m%d}_{end_dt:%Y%m%d}.{ext}"
+    return filename, media_type, stream(params["table"], start_dt, end_dt)
+
+export_jobs.register("monthly_csv", _prepare_monthly_csv, lambda p: _monthly_csv_export(p["year"], p["month"], p["gzip"]))
+export_jobs.register("parquet", _prepare_columnar, lambda p: _columnar_export(p, "parquet", "application/vnd.apache.parquet", _stream_parquet))
+export_jobs.register("arrow", _prepare_columnar, lambda p: _columnar_export(p, "arrows", "application/vnd.apache.arrow.stream", _stream_arrow))
+
+def _job_status(job) -> dict:
+    status = job.public()
+    status["download_url"] = f"/export/jobs/{job.job_id}/download" if job.status == "done" and job.filename else None
+    return status
+
+def _get_job(job_id: str):
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found or expired")
+    return job
+
+@router.post("/export/jobs", status_code=202)
+def create_export_job(input: ExportJobInput, user = Depends(get_current_user)):
+    ensure_admin(user)
+    job, created = export_jobs.submit(input.kind, input.params)
+    body = _job_status(job)
+    body["deduplicated"] = not created
+    return JSONResponse(body, status_code=202, headers={"Location": f"/export/jobs/{job.job_id}"})
+
+@router.get("/export/jobs/{job_id}")
+def get_export_job(job_id: str, user = Depends(get_current_user)):
+    ensure_admin(user)
+    return _job_status(_get_job(job_id))
+
+@router.get("/export/jobs/{job_id}/download")
+def download_export_job(job_id: str, range_header: Optional[str] = Header(None, alias="range"), if_range: Optional[str] = Header(None), user = Depends(get_current_user)):
+    ensure_admin(user)
+    job = _get_job(job_id)
+    if job.status != "done" or not job.filename:
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}, nothing to download")
+    path = export_jobs.data_path(job.job_id)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Export file expired")
+
+    etag = f'"{job.job_id}-{size}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="{job.filename}"',
+    }
+    # A resumed download whose validator no longer matches gets the whole file again
+    byte_range = parse_range(range_header, size) if not if_range or if_range == etag else None
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_file(path, 0, size), media_type=job.media_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iter_file(path, start, end - start + 1), status_code=206, media_type=job.media_type, headers=headers)
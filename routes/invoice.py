@@ -1,67 +1,116 @@
-from fastapi import APIRouter, Depends, HTTPException
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.orm import Session
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
+from typing import Optional
 
-from models import Bill, Client, BillItem, Product
-from database import get_db   # ✅ DB session comes from database.py
-from security import get_current_user, ensure_staff_or_admin  # ✅ auth helpers live in security.py
+from bill_cache import load_bill, iter_bills, etag_header, is_not_modified
+from invoice_template import render_invoice, render_batch
+from database import get_db, SessionLocal   # ✅ DB session comes from database.py
+from security import get_current_user, ensure_admin, ensure_staff_or_admin  # ✅ auth helpers live in security.py
 
 router = APIRouter()
 
+# 0 renders in the streaming thread itself
+INVOICE_RENDER_WORKERS = int(os.getenv("INVOICE_RENDER_WORKERS", str(os.cpu_count() or 1)))
+INVOICE_RENDER_BATCH = 200   # bills per worker task
+
+_render_pool = None
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        # spawn: workers only import invoice_template, never inherit DB connections or threads
+        _render_pool = ProcessPoolExecutor(max_workers=INVOICE_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
 @router.get("/bills/{bill_id}/invoice")
-def render_invoice_html(bill_id: int, db: Session = Depends(get_db), user = Depends(get_current_user)):
+def render_invoice_html(bill_id: int, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db), user = Depends(get_current_user)):
     ensure_staff_or_admin(user)
-    bill = db.query(Bill).filter(Bill.bill_id == bill_id).first()
-    if not bill:
-        raise HTTPException(status_code=404, detail="Bill not found")
+    bill = load_bill(db, bill_id)
+    etag = etag_header(bill, "html")
+    if is_not_modified(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
 
-    client = db.query(Client).filter(Client.client_id == bill.client_id).first()
-    items = db.query(BillItem, Product).join(Product, BillItem.product_id == Product.product_id).filter(BillItem.bill_id == bill_id).all()
+    html = render_invoice(bill)
+    return HTMLResponse(content=html, headers={"ETag": etag})
 
-    # Build table rows
-    rows = "".join(
-        f"<tr><td>{p.name}</td>"
-        f"<td style='text-align:right'>{bi.quantity}</td>"
-        f"<td style='text-align:right'>{bi.price:.2f}</td>"
-        f"<td style='text-align:right'>{bi.subtotal:.2f}</td></tr>"
-        for (bi, p) in items
-    )
+class _ZipSink(io.RawIOBase):
+    # Unseekable on purpose: zipfile then writes data descriptors and never seeks back,
+    # so each finished entry can be handed to the client and dropped
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
 
-    # Full HTML invoice
-    html = f"""
-    <html>
-    <head>
-      <title>Invoice #{bill.bill_id}</title>
-      <style>
-        body {{ font-family: Arial, sans-serif; margin: 24px; }}
-        h1 {{ margin-bottom: 4px; }}
-        .meta {{ margin-bottom: 16px; color: #444; }}
-        table {{ width: 100%; border-collapse: collapse; }}
-        th, td {{ border-bottom: 1px solid #ddd; padding: 8px; }}
-        th {{ text-align: left; background: #f7f7f7; }}
-        .totals td {{ font-weight: bold; }}
-      </style>
-    </head>
-    <body>
-      <h1>Invoice #{bill.bill_id}</h1>
-      <div class="meta">
-        <div><strong>Date:</strong> {bill.date.isoformat()}</div>
-        <div><strong>Client:</strong> {client.name if client else ""}</div>
-        <div><strong>Phone:</strong> {client.phone or ""}</div>
-      </div>
-      <table>
-        <thead>
-          <tr><th>Product</th><th style="text-align:right">Qty</th><th style="text-align:right">Price</th><th style="text-align:right">Subtotal</th></tr>
-        </thead>
-        <tbody>
-          {rows}
-          <tr class="totals"><td colspan="3" style="text-align:right">Total</td><td style="text-align:right">{bill.total_amount:.2f}</td></tr>
-          <tr class="totals"><td colspan="3" style="text-align:right">Discount</td><td style="text-align:right">-{bill.discount:.2f}</td></tr>
-          <tr class="totals"><td colspan="3" style="text-align:right">Final</td><td style="text-align:right">{bill.final_amount:.2f}</td></tr>
-        </tbody>
-      </table>
-    </body>
-    </html>
-    """
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
 
-    return HTMLResponse(content=html)
\ No newline at end of file
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _batches(bills, size):
+    batch = []
+    for bill in bills:
+        batch.append(bill)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _rendered(db: Session, start_dt: datetime, end_dt: datetime):
+    batches = _batches(iter_bills(db, start_dt, end_dt), INVOICE_RENDER_BATCH)
+    if INVOICE_RENDER_WORKERS <= 0:
+        for batch in batches:
+            yield render_batch(batch)
+        return
+    # Bounded read-ahead keeps every worker busy without loading the whole range
+    pool = _get_render_pool()
+    pending = []
+    for batch in batches:
+        pending.append(pool.submit(render_batch, batch))
+        if len(pending) > INVOICE_RENDER_WORKERS * 2:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+def _stream_invoice_zip(start_dt: datetime, end_dt: datetime):
+    # Own session: the request-scoped one is closed before the body is streamed
+    db = SessionLocal()
+    sink = _ZipSink()
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for entries in _rendered(db, start_dt, end_dt):
+                for name, html in entries:
+                    zf.writestr(name, html)
+                yield sink.drain()
+        yield sink.drain()   # central directory
+    finally:
+        db.close()
+
+@router.get("/invoices/batch")
+def batch_invoices(start: str, end: str, user = Depends(get_current_user)):
+    # [start, end) range, same as the columnar exports: one day is start=2026-10-18&end=2026-10-19
+    ensure_admin(user)
+    try:
+        start_dt, end_dt = datetime.fromisoformat(start), datetime.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be ISO dates")
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    filename = f"invoices_{start_dt.date()}_{end_dt.date()}.zip"
+    return StreamingResponse(
+        _stream_invoice_zip(start_dt, end_dt),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
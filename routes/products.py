@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy import Boolean, Float, Integer, bindparam, cast, column, func, update, values
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from models import Product
-from schemas import ProductInput, ProductUpdatePriceInput, ProductUpdateStockInput
-from database import get_db   # ✅ DB session comes from database.py
+from schemas import ProductInput, ProductUpdatePriceInput, ProductUpdateStockInput, ProductBulkUpdateItem, ProductBulkUpdateResult
+from database import get_db, db_for, run_db   # ✅ DB session comes from database.py
 from security import get_current_user, ensure_admin, ensure_staff_or_admin  # ✅ auth helpers live in security.py
+from bill_cache import is_not_modified
+import catalog
+from changes import record_changes
 
 router = APIRouter()
 
+BULK_UPDATE_CHUNK_SIZE = int(os.getenv("PRODUCTS_BULK_CHUNK_SIZE", "1000"))
+
 @router.post("/products/add")
 def add_product(input: ProductInput, db: Session = Depends(get_db), user = Depends(get_current_user)):
     ensure_admin(user)
@@ -16,15 +25,20 @@ def add_product(input: ProductInput, db: Session = Depends(get_db), user = Depen
         raise HTTPException(status_code=400, detail="Product already exists")
     product = Product(name=input.name, price=input.price, stock=input.stock, is_active=True)
     db.add(product)
+    db.flush()
+    record_changes(db, [("product", product.product_id, "create")])
     db.commit()
+    catalog.bump_version()
     db.refresh(product)
     return {"message": "Product added", "product_id": product.product_id}
 
 @router.get("/products/list")
-def list_products(db: Session = Depends(get_db), user = Depends(get_current_user)):
+async def list_products(if_none_match: Optional[str] = Header(None), db = Depends(db_for("products")), user = Depends(get_current_user)):
     ensure_staff_or_admin(user)
-    products = db.query(Product).filter(Product.is_active == True).order_by(Product.name.asc()).all()
-    return [{"product_id": p.product_id, "name": p.name, "price": p.price, "stock": p.stock} for p in products]
+    snap = catalog.current() or await run_db(db, catalog.load)
+    if is_not_modified(if_none_match, snap.etag):
+        return Response(status_code=304, headers={"ETag": snap.etag})
+    return Response(content=snap.body, media_type="application/json", headers={"ETag": snap.etag})
 
 @router.post("/products/update_price")
 def update_product_price(input: ProductUpdatePriceInput, db: Session = Depends(get_db), user = Depends(get_current_user)):
@@ -33,7 +47,10 @@ def update_product_price(input: ProductUpdatePriceInput, db: Session = Depends(g
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     product.price = input.new_price
+    db.flush()   # product row lock before the change-feed counter, same order as create_bill
+    record_changes(db, [("product", product.product_id, "update")])
     db.commit()
+    catalog.bump_version()
     return {"message": "Price updated", "product_id": product.product_id, "price": product.price}
 
 @router.post("/products/update_stock")
@@ -43,7 +60,10 @@ def update_product_stock(input: ProductUpdateStockInput, db: Session = Depends(g
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     product.stock = input.new_stock
+    db.flush()
+    record_changes(db, [("product", product.product_id, "update")])
     db.commit()
+    catalog.bump_version()
     return {"message": "Stock updated", "product_id": product.product_id, "stock": product.stock}
 
 @router.delete("/products/{product_id}")
@@ -53,7 +73,10 @@ def delete_product(product_id: int, db: Session = Depends(get_db), user = Depend
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     product.is_active = False
+    db.flush()
+    record_changes(db, [("product", product_id, "delete")])
     db.commit()
+    catalog.bump_version()
     return {"message": f"Product {product_id} marked inactive"}
 
 @router.post("/products/restore/{product_id}")
@@ -63,5 +86,96 @@ def restore_product(product_id: int, db: Session = Depends(get_db), user = Depen
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     product.is_active = True
+    db.flush()
+    record_changes(db, [("product", product_id, "update")])
     db.commit()
-    return {"message": f"Product {product_id} restored", "is_active": product.is_active}
\ No newline at end of file
+    catalog.bump_version()
+    return {"message": f"Product {product_id} restored", "is_active": product.is_active}
+
+# -----------------------------
+# Bulk price/stock feed
+# -----------------------------
+def _apply_product_updates(db: Session, rows: List[ProductBulkUpdateItem]):
+    products = Product.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        # One UPDATE ... FROM (VALUES ...) per chunk; omitted fields are NULL and keep the current value.
+        # The casts type all-NULL columns, which Postgres would otherwise read as text.
+        v = values(
+            column("product_id", Integer), column("price", Float), column("stock", Integer), column("is_active", Boolean),
+            name="v",
+        ).data([(r.product_id, r.price, r.stock, r.is_active) for r in rows])
+        db.execute(
+            update(products)
+            .where(products.c.product_id == v.c.product_id)
+            .values(
+                price=func.coalesce(cast(v.c.price, Float), products.c.price),
+                stock=func.coalesce(cast(v.c.stock, Integer), products.c.stock),
+                is_active=func.coalesce(cast(v.c.is_active, Boolean), products.c.is_active),
+            )
+        )
+        return
+    # SQLite has no column aliases on VALUES: a single executemany of the same statement instead
+    db.execute(
+        update(products)
+        .where(products.c.product_id == bindparam("b_product_id"))
+        .values(
+            price=func.coalesce(bindparam("b_price", type_=Float), products.c.price),
+            stock=func.coalesce(bindparam("b_stock", type_=Integer), products.c.stock),
+            is_active=func.coalesce(bindparam("b_is_active", type_=Boolean), products.c.is_active),
+        ),
+        [{"b_product_id": r.product_id, "b_price": r.price, "b_stock": r.stock, "b_is_active": r.is_active} for r in rows],
+    )
+
+def _update_product_chunk(db: Session, chunk) -> List[ProductBulkUpdateResult]:
+    results: Dict[int, ProductBulkUpdateResult] = {}
+    # Rows for the same product are merged field by field in input order, so a feed that
+    # sends {price} and {stock} separately applies both; a later non-null value wins
+    merged: Dict[int, ProductBulkUpdateItem] = {}
+    indexes: Dict[int, List[int]] = {}
+    for index, item in chunk:
+        fields = item.model_dump(exclude_none=True, exclude={"product_id"})
+        if not fields:
+            results[index] = ProductBulkUpdateResult(index=index, product_id=item.product_id, status="failed", error="Nothing to update")
+            continue
+        current = merged.get(item.product_id)
+        merged[item.product_id] = current.model_copy(update=fields) if current else item
+        indexes.setdefault(item.product_id, []).append(index)
+
+    if merged:
+        # Lock in product_id order, the same order checkouts use, and learn which ids exist
+        existing = {pid for (pid,) in db.query(Product.product_id)
+                    .filter(Product.product_id.in_(list(merged)))
+                    .order_by(Product.product_id.asc())
+                    .with_for_update()}
+        to_apply = [merged[pid] for pid in sorted(merged) if pid in existing]
+        if to_apply:
+            _apply_product_updates(db, to_apply)
+            # Deactivating through the feed is a delete, as in delete_product
+            record_changes(db, [("product", r.product_id, "delete" if r.is_active is False else "update") for r in to_apply])
+        for pid, pid_indexes in indexes.items():
+            for index in pid_indexes:
+                if pid in existing:
+                    results[index] = ProductBulkUpdateResult(index=index, product_id=pid, status="updated")
+                else:
+                    results[index] = ProductBulkUpdateResult(index=index, product_id=pid, status="not_found", error="Product not found")
+    return [results[i] for i, _ in chunk]
+
+@router.post("/products/bulk_update", response_model=List[ProductBulkUpdateResult])
+def bulk_update_products(
+    inputs: List[ProductBulkUpdateItem],
+    chunk_size: int = Query(BULK_UPDATE_CHUNK_SIZE, gt=0, le=10000),
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user),
+):
+    ensure_admin(user)
+    results: List[ProductBulkUpdateResult] = []
+    for offset in range(0, len(inputs), chunk_size):
+        chunk = list(enumerate(inputs[offset:offset + chunk_size], start=offset))
+        try:
+            results.extend(_update_product_chunk(db, chunk))
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            results.extend(ProductBulkUpdateResult(index=i, product_id=item.product_id, status="failed", error=f"Database error: {e.__class__.__name__}") for i, item in chunk)
+    catalog.bump_version()
+    return results
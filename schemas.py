@@ -24,6 +24,18 @@ class ProductUpdateStockInput(BaseModel):
     product_id: int
     new_stock: int = Field(ge=0)
 
+class ProductBulkUpdateItem(BaseModel):
+    product_id: int
+    price: Optional[float] = Field(None, gt=0)
+    stock: Optional[int] = Field(None, ge=0)
+    is_active: Optional[bool] = None
+
+class ProductBulkUpdateResult(BaseModel):
+    index: int
+    product_id: int
+    status: str   # "updated" | "not_found" | "failed"
+    error: Optional[str] = None
+
 class ProductDeactivateResponse(BaseModel):
     product_id: int
     is_active: bool
@@ -40,6 +52,13 @@ class BillCreateInput(BaseModel):
     items: List[BillItemInput]
     discount: float = Field(default=0, ge=0)
 
+class BillBulkResult(BaseModel):
+    index: int
+    status: str   # "created" | "failed"
+    bill_id: Optional[int] = None
+    final_amount: Optional[float] = None
+    error: Optional[str] = None
+
 class BillSummary(BaseModel):
     bill_id: int
     client_name: str
@@ -48,6 +67,39 @@ class BillSummary(BaseModel):
     discount: float
     final_amount: float
 
+class BillPage(BaseModel):
+    items: List[BillSummary]
+    next_cursor: Optional[str] = None
+
+class ClientSummary(BaseModel):
+    client_id: int
+    name: str
+    phone: Optional[str] = None
+    total_spent: float
+
+class ClientPage(BaseModel):
+    items: List[ClientSummary]
+    next_cursor: Optional[str] = None
+
+class ClientHistoryBill(BaseModel):
+    bill_id: int
+    date: str
+    total_amount: float
+    discount: float
+    final_amount: float
+
+class ClientHistory(BaseModel):
+    client_id: int
+    name: str
+    phone: Optional[str] = None
+    total_spent: float
+    bill_count: int                       # stats cover every bill in the date filter, not just this page
+    first_purchase: Optional[str] = None
+    last_purchase: Optional[str] = None
+    average_ticket: float
+    bills: List[ClientHistoryBill]
+    next_cursor: Optional[str] = None
+
 class BillDetailItem(BaseModel):
     product_id: int
     name: str
@@ -73,8 +125,28 @@ class SalesSummaryResponse(BaseModel):
     total_discount: float
     final_revenue: float
     items_sold: int
+    weekly_sales: List[dict] = []
+    weekly_discounts: List[dict] = []
+    top_products: List[dict] = []
 
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
-    role: str   # ✅ add this
\ No newline at end of file
+    role: str   # ✅ add this
+
+class ExportJobInput(BaseModel):
+    kind: str                 # monthly_csv | parquet | arrow | rollups_rebuild
+    params: dict = {}
+
+class ChangeEntry(BaseModel):
+    seq: int
+    entity: str               # bill | product | client
+    id: int
+    op: str                   # create | update | delete
+    changed_at: str
+    data: Optional[dict] = None
+
+class ChangePage(BaseModel):
+    changes: List[ChangeEntry]
+    next_cursor: str          # pass back as ?since= to resume
+    has_more: bool
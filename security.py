@@ -1,3 +1,8 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
@@ -5,6 +10,7 @@ from fastapi import Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
+from cache import TTLCache
 
 # -----------------------------
 # Config
@@ -13,6 +19,14 @@ SECRET_KEY = "CHANGE_ME_STRONG_SECRET"   # or load from env
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
+# Role changes / removals take effect within this window unless invalidate_user_cache() is called
+USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024"))
+
+# bcrypt runs on its own small pool so login storms don't starve the shared request threadpool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # -----------------------------
@@ -24,6 +38,62 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+class _HashPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0        # queued + running
+        self.running = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._workers = workers
+        self._lock = threading.Lock()
+
+    def _run(self, fn, args):
+        with self._lock:
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Authentication busy, please retry")
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._run, fn, args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self._workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "queued": self.pending - self.running,
+                "running": self.running,
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+hash_pool = _HashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+async def get_password_hash_async(password: str) -> str:
+    return await hash_pool.submit(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hash_pool.submit(verify_password, plain_password, hashed_password)
+
 # -----------------------------
 # JWT helpers
 # -----------------------------
@@ -39,19 +109,42 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 from fastapi.security import OAuth2PasswordBearer
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+@dataclass(frozen=True)
+class CurrentUser:
+    user_id: int
+    username: str
+    role: str
+
+# username -> CurrentUser; a hit is a users lookup avoided
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_user_cache(username: str = None):
+    if username is None:
+        user_cache.clear()
+    else:
+        user_cache.invalidate(username)
+
 def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
     username: str = payload.get("sub")
     if username is None:
         raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
-def ensure_admin(user: User):
+    current = user_cache.get(username)
+    if current is None:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        current = CurrentUser(user_id=user.user_id, username=user.username, role=user.role)
+        user_cache.set(username, current)
+    return current
+
+def ensure_admin(user: CurrentUser):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
 
-def ensure_staff_or_admin(user: User):
+def ensure_staff_or_admin(user: CurrentUser):
     if user.role not in ("admin", "staff"):
         raise HTTPException(status_code=403, detail="Staff/Admin access required")
\ No newline at end of file
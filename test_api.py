@@ -80,5 +80,9 @@ if resp.status_code == 200:
         resp = requests.get(f"{BASE_URL}/clients/list", headers=headers)
         print("Client List:", resp.status_code, resp.json())
 
+        # 5. Type-ahead client search
+        resp = requests.get(f"{BASE_URL}/clients/search", params={"q": "ali"}, headers=headers)
+        print("Client Search:", resp.status_code, resp.json())
+
 else:
     print("❌ Login failed, cannot test protected routes.")
\ No newline at end of file